@@ -0,0 +1,118 @@
+import numpy as np
+
+from board import FLAGGED, MINE, UNKNOWN, count_neighbors, neighbor_table, sample_mines
+
+
+class BatchBoard:
+    # Many boards of one shape and mine count, stepped in lockstep. Per-cell state is kept as (n_boards, n_cells)
+    # arrays using the same cell ids as Board, so one step is a fixed number of array operations for the whole batch.
+    # Boards that finish are started over automatically.
+    def __init__(self, n_boards: int, n_rows: int, n_cols: int, n_mines: int, seed=None) -> None:
+        self.n_boards = n_boards
+        self.n_rows = n_rows
+        self.n_cols = n_cols
+        self.n_mines = n_mines
+        self.n_cells = n_rows * n_cols
+        self.nbrs = neighbor_table(n_rows, n_cols)
+        self.rng = np.random.default_rng(seed)
+
+        shape = (n_boards, self.n_cells)
+        self.mines = np.zeros(shape, dtype=bool)
+        self.revealed = np.zeros(shape, dtype=bool)
+        self.flagged = np.zeros(shape, dtype=bool)
+        self.counts = np.zeros(shape, dtype=np.int8)
+        self.visible = np.full(shape, UNKNOWN, dtype=np.int8)
+        self.visible_grid = self.visible.reshape(n_boards, n_cols, n_rows).transpose(0, 2, 1)
+
+        # Per-board game state
+        self.has_mines = np.zeros(n_boards, dtype=bool)
+        self.n_revealed = np.zeros(n_boards, dtype=np.int64)
+        self.n_flagged = np.zeros(n_boards, dtype=np.int64)
+        self.n_mines_flagged = np.zeros(n_boards, dtype=np.int64)
+
+    def reset(self, boards=None) -> np.ndarray:
+        # Start the given boards (all of them by default) over; mines are laid on each board's first reveal.
+        # Returns the observation, as step does.
+        if boards is None:
+            boards = slice(None)
+        self.mines[boards] = False
+        self.revealed[boards] = False
+        self.flagged[boards] = False
+        self.counts[boards] = 0
+        self.visible[boards] = UNKNOWN
+        self.has_mines[boards] = False
+        self.n_revealed[boards] = 0
+        self.n_flagged[boards] = 0
+        self.n_mines_flagged[boards] = 0
+        return self.visible_grid
+
+    def step(self, actions, cells):
+        # Apply one move to every board: actions[i] (0 reveal, 1 toggle flag) at cell id cells[i] of board i.
+        # Returns (observation, rewards, dones, info) where the observation is a live (n_boards, n_rows, n_cols) view
+        # of what is visible, rewards are 1 for a win, -1 for a loss and 0 otherwise, and info holds the per-board
+        # 'won' and 'lost' masks and the number of cells each move 'revealed'. Finished boards are reset before
+        # returning, so their observation is already that of the next game.
+        actions = np.asarray(actions)
+        cells = np.asarray(cells)
+        boards = np.arange(self.n_boards)
+        ids = boards * self.n_cells + cells
+        visible = self.visible.reshape(-1)
+
+        # Reveals, laying mines first on boards that have none yet
+        reveal = (actions == 0) & (visible[ids] == UNKNOWN)
+        new = reveal & ~self.has_mines
+        if new.any():
+            self._place_mines(np.flatnonzero(new), cells[new])
+        filled = self._fill(ids[reveal])
+        n_filled = np.bincount(filled // self.n_cells, minlength=self.n_boards)
+        self.n_revealed += n_filled
+        lost = reveal & self.mines[boards, cells]
+
+        # Flag toggles
+        flag = (actions == 1) & ~self.revealed[boards, cells]
+        flag_ids = ids[flag]
+        flagged = self.flagged.reshape(-1)
+        flagged[flag_ids] = ~flagged[flag_ids]
+        visible[flag_ids] = np.where(flagged[flag_ids], FLAGGED, UNKNOWN)
+        delta = np.where(flagged[flag_ids], 1, -1)
+        self.n_flagged[flag] += delta
+        self.n_mines_flagged[flag] += delta * self.mines.reshape(-1)[flag_ids]
+
+        # Same conditions as Grid._check_win: every mine flagged, no false flags, and nothing left unknown
+        won = ((self.n_mines_flagged == self.n_mines) & (self.n_flagged == self.n_mines)
+               & (self.n_revealed == self.n_cells - self.n_mines))
+        rewards = won.astype(np.int8) - lost
+        dones = won | lost
+        if dones.any():
+            self.reset(np.flatnonzero(dones))
+        return self.visible_grid, rewards, dones, {'won': won, 'lost': lost, 'revealed': n_filled}
+
+    def _place_mines(self, boards: np.ndarray, safe_cells: np.ndarray) -> None:
+        for board, safe_cell in zip(boards.tolist(), safe_cells.tolist()):
+            self.mines[board, sample_mines(self.nbrs, self.n_mines, safe_cell, self.rng)] = True
+        counts = np.empty((boards.size, self.n_cells), dtype=np.int8)
+        count_neighbors(self.mines[boards], self.n_rows, self.n_cols, counts)
+        self.counts[boards] = counts
+        self.has_mines[boards] = True
+        # Flags may have gone down before there were any mines to count
+        self.n_mines_flagged[boards] = (self.flagged[boards] & self.mines[boards]).sum(axis=1)
+
+    def _fill(self, start: np.ndarray) -> np.ndarray:
+        # Reveal the given flat (board * n_cells + cell) ids and flood fill every zero among them, across all boards
+        # at once, one ring at a time. Returns the flat ids of every newly revealed cell.
+        visible = self.visible.reshape(-1)
+        revealed = self.revealed.reshape(-1)
+        counts = self.counts.reshape(-1)
+        revealed[start] = True
+        visible[start] = np.where(self.mines.reshape(-1)[start], MINE, counts[start])
+        rings = [start]
+        frontier = start[visible[start] == 0]
+        while frontier.size:
+            cells = frontier % self.n_cells
+            ring = (self.nbrs.padded[cells] + (frontier - cells)[:, None]).ravel()
+            ring = np.unique(ring[visible[ring] == UNKNOWN])
+            revealed[ring] = True
+            visible[ring] = counts[ring]
+            rings.append(ring)
+            frontier = ring[visible[ring] == 0]
+        return np.concatenate(rings)
@@ -0,0 +1,289 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from board import Board, count_neighbors
+from mines import Grid, Solver, difficulties
+
+# Every benchmark is seeded and, apart from the render ones, headless. Each one is a function of the seed that does
+# its own setup, times only the work under test and returns (operations, seconds); the suite runs it a few times and
+# reports the median time per operation. Results can be saved as JSON and compared against a saved baseline.
+
+# Boards beyond the standard difficulties, at expert density (~20%, which keeps zero regions small)
+LARGE_BOARDS = {'100x100': ((100, 100), 2062), '500x500': ((500, 500), 51562), '1000x1000': ((1000, 1000), 206250)}
+
+
+def _linear_id_to_box(grid):
+    # The lookup Grid used before it kept an index: a scan over every box
+    boxes = [grid._id_to_box(box_id) for box_id in range(grid.n_rows * grid.n_cols)]
+
+    def id_to_box(box_id):
+        return [box for box in boxes if box.get_id() == box_id][0]
+    return id_to_box
+
+
+def bench_reveal(dims, num_mines, linear_lookup=False, max_reveals=None, seed=0):
+    # Reveal every safe cell of a seeded board, one reveal per still-hidden cell, and report the cost per cell
+    random.seed(seed)
+    grid = Grid(dims, num_mines, headless=True, solver=Solver(), seed=seed)
+    if linear_lookup:
+        grid._id_to_box = _linear_id_to_box(grid)
+    # Open the board where the solver would, laying the mines
+    grid.step(0, grid.solver.get_move(grid)[1])
+
+    order = [box_id for box_id in range(grid.board.n_cells) if not grid.board.mines[box_id]]
+    random.shuffle(order)
+    n_reveals = 0
+    revealed_before = int(grid.board.revealed.sum())
+    t0 = time.perf_counter()
+    for box_id in order:
+        if max_reveals is not None and n_reveals >= max_reveals:
+            break
+        box = grid._id_to_box(box_id)
+        if not box.is_revealed:
+            grid.reveal(box)
+            n_reveals += 1
+    elapsed = time.perf_counter() - t0
+    n_cells = int(grid.board.revealed.sum()) - revealed_before
+    return {'reveals': n_reveals, 'cells': n_cells, 'seconds': elapsed, 'us_per_cell': 1e6 * elapsed / max(n_cells, 1)}
+
+
+def bench_grid_init(dims, num_mines, n=1):
+    def bench(seed):
+        t0 = time.perf_counter()
+        for i in range(n):
+            Grid(dims, num_mines, headless=True, seed=seed + i)
+        return n, time.perf_counter() - t0
+    return bench
+
+
+def bench_place_mines(dims, num_mines, n=1):
+    # Mine placement as on the first move: sampling a layout around the first cell and counting neighbors
+    def bench(seed):
+        grid = Grid(dims, num_mines, headless=True, seed=seed)
+        first = grid.board.cell_id(dims[0] // 2, dims[1] // 2)
+        t0 = time.perf_counter()
+        for _ in range(n):
+            grid._place_mines(first)
+        return n, time.perf_counter() - t0
+    return bench
+
+
+def bench_count_neighbors(dims, num_mines, n=1):
+    def bench(seed):
+        board = Board(dims[0], dims[1], num_mines)
+        board.place_mines(0, seed)
+        out = np.empty(board.n_cells, dtype=np.int8)
+        t0 = time.perf_counter()
+        for _ in range(n):
+            count_neighbors(board.mines, board.n_rows, board.n_cols, out)
+        return n, time.perf_counter() - t0
+    return bench
+
+
+def bench_reveal_zero(dims):
+    # The worst case for a reveal: one mine in a corner, so revealing the opposite corner floods the whole board.
+    # Operations are cells revealed.
+    def bench(seed):
+        board = Board(dims[0], dims[1], 1)
+        board.set_mines([board.n_cells - 1])
+        t0 = time.perf_counter()
+        cells = board.reveal(0)
+        return cells.size, time.perf_counter() - t0
+    return bench
+
+
+def bench_reveal_cells(dims, num_mines, linear_lookup=False, max_reveals=None):
+    # Operations are cells revealed; see bench_reveal
+    def bench(seed):
+        result = bench_reveal(dims, num_mines, linear_lookup, max_reveals, seed)
+        return result['cells'], result['seconds']
+    return bench
+
+
+def bench_id_to_box(dims, num_mines, n_passes=20):
+    def bench(seed):
+        grid = Grid(dims, num_mines, headless=True, seed=seed)
+        cells = range(grid.board.n_cells)
+        for box_id in cells:
+            grid._id_to_box(box_id)
+        t0 = time.perf_counter()
+        for _ in range(n_passes):
+            for box_id in cells:
+                grid._id_to_box(box_id)
+        return n_passes * len(cells), time.perf_counter() - t0
+    return bench
+
+
+def bench_solver(solver_type, dims, num_mines, n_games=10):
+    # Solver.get_action through a headless Grid, over whole seeded games. Operations are moves; only choosing them is
+    # timed.
+    def bench(seed):
+        n_moves = 0
+        seconds = 0.0
+        for game_seed in range(seed, seed + n_games):
+            solver = Solver(solver_type, seed=game_seed)
+            grid = Grid(dims, num_mines, headless=True, solver=solver, seed=game_seed)
+            done = False
+            while not done:
+                t0 = time.perf_counter()
+                action, box = solver.get_action(grid)
+                seconds += time.perf_counter() - t0
+                n_moves += 1
+                _, _, done, _ = grid.step(action, box.get_id())
+        return n_moves, seconds
+    return bench
+
+
+def _display_grid(dims, num_mines, seed, **kwargs):
+    # A drawn grid, on SDL's dummy video driver unless another was chosen, with its first move made
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+    grid = Grid(dims, num_mines, seed=seed, **kwargs)
+    grid.step(0, grid.board.cell_id(dims[0] // 2, dims[1] // 2))
+    return grid
+
+
+def bench_render_boxes(dims, num_mines, n_passes=5):
+    # Redrawing every box of a drawn grid (BoxGraphics tiles). Operations are boxes drawn.
+    def bench(seed):
+        import mines
+
+        grid = _display_grid(dims, num_mines, seed)
+        boxes = list(grid.boxes.values())
+        t0 = time.perf_counter()
+        for _ in range(n_passes):
+            for box in boxes:
+                box.draw()
+            mines.dirty_rects.clear()
+        return n_passes * len(boxes), time.perf_counter() - t0
+    return bench
+
+
+def bench_render_view(dims, num_mines, n=5):
+    # Redrawing the whole viewport of a board too big for the window
+    def bench(seed):
+        import mines
+
+        grid = _display_grid(dims, num_mines, seed, viewport=True)
+        t0 = time.perf_counter()
+        for _ in range(n):
+            grid._draw_view()
+            mines.dirty_rects.clear()
+        return n, time.perf_counter() - t0
+    return bench
+
+
+def bench_render_scoreboard(dims, num_mines, n=200):
+    # Redrawing every scoreboard panel, as when all of their text changes
+    def bench(seed):
+        import mines
+
+        grid = _display_grid(dims, num_mines, seed)
+        t0 = time.perf_counter()
+        for _ in range(n):
+            grid._sb_shown = [None] * len(grid._sb_panels)
+            grid._update_scoreboard()
+            mines.dirty_rects.clear()
+        return n, time.perf_counter() - t0
+    return bench
+
+
+def suite(large_reveals=200):
+    # (name, benchmark) for every benchmark, in the order they run
+    expert = (difficulties['expert']['dims'], difficulties['expert']['num_mines'])
+    cases = []
+    for name, difficulty in difficulties.items():
+        cases.append((f'grid_init/{name}', bench_grid_init(difficulty['dims'], difficulty['num_mines'], 50)))
+    for name, (dims, num_mines) in LARGE_BOARDS.items():
+        cases.append((f'grid_init/{name}', bench_grid_init(dims, num_mines)))
+    for name, (dims, num_mines) in [('expert', expert)] + list(LARGE_BOARDS.items()):
+        n = 100 if name == 'expert' else 2
+        cases.append((f'place_mines/{name}', bench_place_mines(dims, num_mines, n)))
+        cases.append((f'count_neighbors/{name}', bench_count_neighbors(dims, num_mines, n)))
+    for name, (dims, _) in [('expert', expert)] + list(LARGE_BOARDS.items()):
+        cases.append((f'reveal_zero/{name}', bench_reveal_zero(dims)))
+    cases += [('reveal_cells/expert', bench_reveal_cells(*expert)),
+              ('reveal_cells/expert/linear_lookup', bench_reveal_cells(*expert, linear_lookup=True)),
+              ('reveal_cells/500x500', bench_reveal_cells(*LARGE_BOARDS['500x500'])),
+              ('reveal_cells/500x500/linear_lookup',
+               bench_reveal_cells(*LARGE_BOARDS['500x500'], linear_lookup=True, max_reveals=large_reveals)),
+              ('id_to_box/expert', bench_id_to_box(*expert))]
+    for solver_type in ('rl', 'logic', 'prob'):
+        cases.append((f'solver/{solver_type}/expert', bench_solver(solver_type, *expert)))
+    cases += [('render/boxes/expert', bench_render_boxes(*expert)),
+              ('render/viewport/500x500', bench_render_view(*LARGE_BOARDS['500x500'])),
+              ('render/scoreboard/expert', bench_render_scoreboard(*expert))]
+    return cases
+
+
+def run_suite(cases, seed=0, repeat=5, log=print) -> dict:
+    results = {}
+    for name, bench in cases:
+        times = []
+        n_ops = 0
+        for _ in range(repeat):
+            n_ops, seconds = bench(seed)
+            times.append(seconds / max(n_ops, 1))
+        results[name] = {'us': 1e6 * statistics.median(times), 'min_us': 1e6 * min(times), 'ops': n_ops,
+                         'repeat': repeat}
+        log(f'{name:<40}{results[name]["us"]:>14.3f} us/op')
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    # Benchmarks that got slower than the baseline by more than tolerance (0.2 = 20%), as (name, baseline us,
+    # current us)
+    regressions = []
+    for name, result in results.items():
+        if name in baseline and result['us'] > baseline[name]['us'] * (1 + tolerance):
+            regressions.append((name, baseline[name]['us'], result['us']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark Minesweeper hot paths.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5, help='runs per benchmark; the median is reported')
+    parser.add_argument('--filter', default=None, help='only run benchmarks whose name contains this')
+    parser.add_argument('--large-reveals', type=int, default=200,
+                        help='reveals to time on the 500x500 board with the linear lookup')
+    parser.add_argument('--json', help='write the results to this file (e.g. to keep as a baseline)')
+    parser.add_argument('--baseline', help='compare against results saved earlier with --json')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='slowdown over the baseline allowed before failing, as a fraction')
+    args = parser.parse_args(argv)
+
+    cases = [(name, bench) for name, bench in suite(args.large_reveals) if not args.filter or args.filter in name]
+    results = run_suite(cases, args.seed, args.repeat)
+    report = {'meta': {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+                       'cpus': os.cpu_count(), 'seed': args.seed, 'repeat': args.repeat,
+                       'time': time.strftime('%Y-%m-%dT%H:%M:%S')},
+              'results': results}
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        print(f'\n{"benchmark":<40}{"baseline us":>14}{"now us":>14}{"change":>9}')
+        for name, result in results.items():
+            if name in baseline:
+                change = result['us'] / baseline[name]['us'] - 1
+                print(f'{name:<40}{baseline[name]["us"]:>14.3f}{result["us"]:>14.3f}{change:>+9.1%}')
+        regressions = compare(results, baseline, args.tolerance)
+        for name, before, after in regressions:
+            print(f'REGRESSION {name}: {before:.3f} -> {after:.3f} us/op')
+        return int(bool(regressions))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
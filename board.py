@@ -0,0 +1,332 @@
+import weakref
+from functools import lru_cache
+
+import numpy as np
+
+
+# Cells are identified by a single integer id. Ids run down each column first, so that
+# cell_id = col * n_rows + row (the same ordering Grid has always used for its boxes).
+
+_OFFSETS = [(dr, dc) for dc in (-1, 0, 1) for dr in (-1, 0, 1) if dr or dc]
+
+# Flood fills expand cell by cell until they have revealed this many cells, then switch to whole rings at a time.
+# Most regions on standard boards are far smaller, and below this size per-cell Python beats per-ring array setup.
+_FILL_RING_THRESHOLD = 256
+
+# What a player can see of each cell: its neighbor count once revealed, otherwise one of these
+UNKNOWN = -1
+FLAGGED = -2
+MINE = -3
+
+
+class NeighborTable:
+    # Adjacency of every cell on a board of a given shape, in CSR form: the neighbors of cell i are
+    # indices[indptr[i]:indptr[i + 1]], in increasing id order. The same adjacency is also kept as an
+    # (n_cells, 8) array, padded with each cell's own id, for gathering whole neighborhoods in a single indexing
+    # operation. Tables are shared between boards, so read-only.
+    def __init__(self, n_rows: int, n_cols: int) -> None:
+        self.n_rows = n_rows
+        self.n_cols = n_cols
+        cells = np.arange(n_rows * n_cols)
+        rows = cells % n_rows
+        cols = cells // n_rows
+        ids = np.empty((cells.size, len(_OFFSETS)), dtype=np.int32)
+        ok = np.empty(ids.shape, dtype=bool)
+        for k, (dr, dc) in enumerate(_OFFSETS):
+            r = rows + dr
+            c = cols + dc
+            ok[:, k] = (r >= 0) & (r < n_rows) & (c >= 0) & (c < n_cols)
+            ids[:, k] = c * n_rows + r
+        self.indices = ids[ok]
+        self.indptr = np.zeros(cells.size + 1, dtype=np.int64)
+        np.cumsum(ok.sum(axis=1), out=self.indptr[1:])
+        self.padded = np.where(ok, ids, cells[:, None].astype(np.int32))
+        for arr in (self.indices, self.indptr, self.padded):
+            arr.flags.writeable = False
+
+    def __getitem__(self, cell: int) -> np.ndarray:
+        return self.indices[self.indptr[cell]:self.indptr[cell + 1]]
+
+    def gather(self, cells: np.ndarray) -> np.ndarray:
+        # Concatenated neighbors of an array of cells, with repeats where neighborhoods overlap. Cells on an edge
+        # also list themselves, to pad out their neighborhood.
+        return self.padded[cells].ravel()
+
+
+@lru_cache(maxsize=16)
+def neighbor_table(n_rows: int, n_cols: int) -> NeighborTable:
+    # Built once per board shape and reused across resets and between boards of the same dimensions
+    return NeighborTable(n_rows, n_cols)
+
+
+def sample_mines(nbrs: NeighborTable, n_mines: int, safe_cell: int, rng: np.random.Generator) -> np.ndarray:
+    # Draw n_mines distinct mine ids uniformly from every cell except safe_cell and, when there is room for them all,
+    # its neighbors. Sampling is directly from the allowed cells, so it cannot fail if any valid layout exists.
+    n_cells = nbrs.n_rows * nbrs.n_cols
+    excluded = np.sort(np.append(nbrs[safe_cell], safe_cell))
+    if n_cells - excluded.size < n_mines:
+        excluded = np.array([safe_cell])
+    n_allowed = n_cells - excluded.size
+    if n_allowed < n_mines:
+        raise ValueError(f'Cannot place {n_mines} mines on a board of {n_cells} cells and keep the first move safe.')
+    # Draw positions among the allowed cells, then shift each one past the excluded ids at or below it
+    picks = rng.choice(n_allowed, n_mines, replace=False)
+    return picks + np.searchsorted(excluded - np.arange(excluded.size), picks, side='right')
+
+
+def count_neighbors(mines: np.ndarray, n_rows: int, n_cols: int, out: np.ndarray) -> None:
+    # Neighboring-mine counts for mine masks of shape (..., n_cells), written to out (int8, same shape). This is a
+    # 3x3 box sum of the zero-padded mine grid (as two separable passes), minus each cell's own mine.
+    lead = mines.shape[:-1]
+    padded = np.zeros(lead + (n_cols + 2, n_rows + 2), dtype=np.int8)
+    inner = padded[..., 1:-1, 1:-1]
+    inner[:] = mines.reshape(lead + (n_cols, n_rows))
+    cols = padded[..., :-2, :] + padded[..., 1:-1, :] + padded[..., 2:, :]
+    counts = out.reshape(lead + (n_cols, n_rows))
+    np.add(cols[..., :-2], cols[..., 1:-1], out=counts)
+    counts += cols[..., 2:]
+    counts -= inner
+
+
+class Board:
+    def __init__(self, n_rows: int, n_cols: int, n_mines: int) -> None:
+        self.n_rows = n_rows
+        self.n_cols = n_cols
+        self.n_mines = n_mines
+        self.n_cells = n_rows * n_cols
+        self.nbrs = neighbor_table(n_rows, n_cols)
+
+        # Per-cell state, indexed by cell id
+        self.mines = np.zeros(self.n_cells, dtype=bool)
+        self.revealed = np.zeros(self.n_cells, dtype=bool)
+        self.flagged = np.zeros(self.n_cells, dtype=bool)
+        self.counts = np.zeros(self.n_cells, dtype=np.int8)
+        self.visible = np.full(self.n_cells, UNKNOWN, dtype=np.int8)
+        self.visible_grid = self.grid_view(self.visible)
+        self.has_mines = False
+        # Arrays of the cells each reveal uncovered, in order, so observers can catch up incrementally
+        self.reveal_log = []
+
+        # Game state, kept up to date by every reveal and flag so that none of it needs a scan of the board
+        self.n_revealed = 0
+        self.n_flagged = 0
+        self.n_mines_flagged = 0
+        self.exploded = False
+        # Unrevealed cells next to a revealed number
+        self.frontier = set()
+        # Whether the per-cell masks may be shared with a clone, in which case they are copied before the next change.
+        # The board that made them keeps them for good, so views of them (visible_grid, say) stay live; the clones
+        # sharing them, listed in _sharers, are the ones handed copies.
+        self._shared = False
+        self._owns_masks = True
+        self._sharers = None
+
+    @property
+    def n_unknown(self) -> int:
+        # Cells neither revealed nor flagged
+        return self.n_cells - self.n_revealed - self.n_flagged
+
+    def result(self) -> int:
+        # 1 once every mine is flagged, nothing else is and every other cell is revealed; -1 once a mine is revealed;
+        # otherwise 0
+        if (self.n_mines_flagged == self.n_mines and self.n_flagged == self.n_mines
+                and self.n_revealed == self.n_cells - self.n_mines):
+            return 1
+        elif self.exploded:
+            return -1
+        return 0
+
+    def cell_id(self, row: int, col: int) -> int:
+        return col * self.n_rows + row
+
+    def cell_pos(self, cell: int) -> (int, int):
+        col, row = divmod(cell, self.n_rows)
+        return row, col
+
+    def grid_view(self, arr: np.ndarray) -> np.ndarray:
+        # 2D (row, col) view of a per-cell array, without copying
+        return arr.reshape(self.n_cols, self.n_rows).T
+
+    def neighbors(self, cell: int) -> np.ndarray:
+        return self.nbrs[cell]
+
+    def place_mines(self, safe_cell: int, rng: np.random.Generator = None) -> np.ndarray:
+        # Lay mines at random, keeping safe_cell (and if possible its neighbors) clear. See sample_mines.
+        mine_ids = sample_mines(self.nbrs, self.n_mines, safe_cell, np.random.default_rng(rng))
+        self.set_mines(mine_ids)
+        return mine_ids
+
+    def set_mines(self, mine_ids) -> None:
+        # The layout is replaced rather than overwritten, since clones may share the old one
+        mines = np.zeros(self.n_cells, dtype=bool)
+        mines[mine_ids] = True
+        counts = np.empty(self.n_cells, dtype=np.int8)
+        count_neighbors(mines, self.n_rows, self.n_cols, counts)
+        self.mines = mines
+        self.counts = counts
+        self.has_mines = True
+        # Flags may have gone down before there were any mines to count
+        self.n_mines_flagged = int((self.flagged & self.mines).sum())
+
+    def reveal(self, cell: int) -> np.ndarray:
+        # Reveal a cell and, if it has no neighboring mines, flood fill its whole zero region plus the numbered
+        # border. The fill is iterative: it starts cell by cell, and once the region proves large carries on
+        # breadth-first one ring at a time, each ring being a handful of array operations regardless of its size.
+        # Returns the ids of every newly revealed cell.
+        if self._shared:
+            self._unshare()
+        revealed = self._reveal(cell)
+        if revealed.size:
+            self._revealed(revealed)
+            if self.mines[cell]:
+                self.exploded = True
+        return revealed
+
+    def _revealed(self, cells: np.ndarray) -> None:
+        # Bring the counters, frontier and log up to date with newly revealed cells
+        self.n_revealed += cells.size
+        self.reveal_log.append(cells)
+        frontier = self.frontier
+        if frontier:
+            frontier.difference_update(cells.tolist())
+        numbers = cells[(self.counts[cells] > 0) & ~self.mines[cells]]
+        if numbers.size:
+            neighbors = self.nbrs.gather(numbers)
+            frontier.update(neighbors[~self.revealed[neighbors]].tolist())
+
+    def _reveal(self, cell: int) -> np.ndarray:
+        if self.revealed[cell] or self.flagged[cell]:
+            return np.empty(0, dtype=np.intp)
+        self.revealed[cell] = True
+        if self.mines[cell]:
+            self.visible[cell] = MINE
+            return np.array([cell], dtype=np.intp)
+        if self.counts[cell] > 0:
+            self.visible[cell] = self.counts[cell]
+            return np.array([cell], dtype=np.intp)
+
+        # Unknown in visible means neither revealed nor flagged
+        visible = self.visible
+        visible[cell] = 0
+        filled = [cell]
+        stack = [cell]
+        while stack and len(filled) < _FILL_RING_THRESHOLD:
+            for neighbor in self.nbrs.padded[stack.pop()].tolist():
+                if visible[neighbor] == UNKNOWN:
+                    count = self.counts[neighbor]
+                    visible[neighbor] = count
+                    filled.append(neighbor)
+                    if count == 0:
+                        stack.append(neighbor)
+        self.revealed[filled] = True
+        if not stack:
+            return np.array(filled, dtype=np.intp)
+
+        rings = [np.array(filled, dtype=np.intp)]
+        frontier = np.array(stack, dtype=np.intp)
+        while frontier.size:
+            ring = self.nbrs.gather(frontier)
+            ring = np.unique(ring[visible[ring] == UNKNOWN])
+            self.revealed[ring] = True
+            visible[ring] = self.counts[ring]
+            rings.append(ring)
+            # Cells bordering a zero cannot be mines, so only the zeros in this ring need expanding further
+            frontier = ring[visible[ring] == 0]
+        return np.concatenate(rings)
+
+    def reveal_cell(self, cell: int) -> int:
+        # Reveal a single cell (no flood fill). Returns its neighbor count, or -1 for a mine.
+        if not self.revealed[cell] and not self.flagged[cell]:
+            if self._shared:
+                self._unshare()
+            self.revealed[cell] = True
+            self.visible[cell] = MINE if self.mines[cell] else self.counts[cell]
+            self._revealed(np.array([cell], dtype=np.intp))
+            if self.mines[cell]:
+                self.exploded = True
+        return -1 if self.mines[cell] else int(self.counts[cell])
+
+    def toggle_flag(self, cell: int) -> bool:
+        # Returns the new flag state. Revealed cells cannot be flagged, and are left as they are.
+        if self.revealed[cell]:
+            return False
+        if self._shared:
+            self._unshare()
+        is_flagged = not self.flagged[cell]
+        self.flagged[cell] = is_flagged
+        self.visible[cell] = FLAGGED if is_flagged else UNKNOWN
+        delta = 1 if is_flagged else -1
+        self.n_flagged += delta
+        if self.mines[cell]:
+            self.n_mines_flagged += delta
+        return is_flagged
+
+    def clone(self) -> 'Board':
+        # An independent copy of the board as it stands. The mine layout and neighbor table are shared, and so are the
+        # per-cell masks until either board next changes them, so cloning costs the same whatever the board size. The
+        # clone's masks may be swapped for copies at any move; this board's never are.
+        clone = object.__new__(Board)
+        clone.__dict__.update(self.__dict__)
+        clone.frontier = set(self.frontier)
+        clone.reveal_log = list(self.reveal_log)
+        if self._sharers is None:
+            self._sharers = weakref.WeakSet()
+        self._sharers.add(clone)
+        clone._sharers = self._sharers
+        clone._owns_masks = False
+        self._shared = clone._shared = True
+        return clone
+
+    def snapshot(self) -> 'Board':
+        # A frozen copy to restore later; it is only a clone that nothing plays on
+        return self.clone()
+
+    def restore(self, snapshot: 'Board') -> None:
+        # Go back to the state a snapshot was taken in. The snapshot is left as it was and can be restored again.
+        # Observers that follow reveal_log see a new log, and so know to start over. A board that owns its masks
+        # copies the snapshot's into them, so views of them stay live; a clone just shares the snapshot's.
+        if not self._owns_masks:
+            self.__dict__.update(snapshot.clone().__dict__)
+            self._sharers.add(self)
+            return
+        # Masks still shared with the snapshot already hold its state
+        unchanged = snapshot.revealed is self.revealed
+        if self._shared and not unchanged:
+            self._unshare()
+        masks = self.revealed, self.flagged, self.visible, self.visible_grid, self._shared, self._sharers
+        self.__dict__.update(snapshot.__dict__)
+        self.frontier = set(snapshot.frontier)
+        self.reveal_log = list(snapshot.reveal_log)
+        if not unchanged:
+            np.copyto(masks[0], snapshot.revealed)
+            np.copyto(masks[1], snapshot.flagged)
+            np.copyto(masks[2], snapshot.visible)
+        self.revealed, self.flagged, self.visible, self.visible_grid, self._shared, self._sharers = masks
+        self._owns_masks = True
+
+    def _unshare(self) -> None:
+        # Stop sharing the masks before changing them. The owner keeps its arrays, and the clones still sharing them
+        # are handed a copy, owned by the first of them; a clone takes a copy for itself.
+        if self._owns_masks:
+            sharers = [board for board in self._sharers if board.revealed is self.revealed]
+            if sharers:
+                first = sharers[0]
+                first.revealed = self.revealed.copy()
+                first.flagged = self.flagged.copy()
+                first.visible = self.visible.copy()
+                first.visible_grid = first.grid_view(first.visible)
+                first._owns_masks = True
+                first._shared = len(sharers) > 1
+                first._sharers = weakref.WeakSet(sharers[1:])
+                for board in sharers[1:]:
+                    board.revealed, board.flagged, board.visible = first.revealed, first.flagged, first.visible
+                    board.visible_grid = first.visible_grid
+                    board._sharers = first._sharers
+        else:
+            self.revealed = self.revealed.copy()
+            self.flagged = self.flagged.copy()
+            self.visible = self.visible.copy()
+            self.visible_grid = self.grid_view(self.visible)
+            self._owns_masks = True
+        self._shared = False
+        self._sharers = None
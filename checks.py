@@ -0,0 +1,124 @@
+import argparse
+import itertools
+import os
+import random
+import sys
+import tempfile
+
+import numpy as np
+
+import replay
+from board import Board
+from solver import ProbabilitySolver
+
+# Correctness checks for code that is easy to get subtly wrong while making it fast. Each check is seeded and returns
+# a list of failures, as messages; main runs them all and exits with 1 if any failed.
+
+
+def check_replay_roundtrip(seed: int = 0) -> list:
+    # Games written to a replay log read back exactly: an empty game, and games on a board with cell ids up to 10^6
+    # whose moves jump both ways, across every varint length
+    failures = []
+    rng = np.random.default_rng(seed)
+    values = np.array([0, 1, 127, 128, 16383, 16384, 2 ** 21 - 1, 2 ** 21, 10 ** 6, 2 ** 35, 2 ** 63 - 1, 2 ** 64 - 1],
+                      dtype=np.uint64)
+    decoded, _ = replay._decode_varints(np.frombuffer(replay._encode_varints(values), dtype=np.uint8), 0, values.size)
+    if not np.array_equal(decoded, values):
+        failures.append(f'varints: {values.tolist()} decoded as {decoded.tolist()}')
+    deltas = np.array([0, 1, -1, 63, -64, 64, -65, 10 ** 6, -10 ** 6], dtype=np.int64)
+    if not np.array_equal(replay._unzigzag(replay._zigzag(deltas)), deltas):
+        failures.append(f'zigzag: {deltas.tolist()} did not round trip')
+
+    n_rows, n_cols = 1000, 1001
+    n_cells = n_rows * n_cols
+    games = [(8, 8, None, [], [], 0), (1, 1, 0, [], [(0, 0)], 1)]
+    for i in range(5):
+        mines = rng.choice(n_cells, size=int(rng.integers(1, 5000)), replace=False)
+        cells = rng.integers(n_cells, size=int(rng.integers(1, 2000)))
+        cells[:3] = [n_cells - 1, 0, n_cells - 1]
+        moves = np.stack([rng.integers(2, size=cells.size), cells], axis=1)
+        games.append((n_rows, n_cols, i, mines, moves, int(rng.integers(-1, 2))))
+
+    fd, path = tempfile.mkstemp(suffix='.msr')
+    os.close(fd)
+    os.remove(path)
+    try:
+        with replay.ReplayWriter(path) as writer:
+            for game in games:
+                writer.write(*game)
+        read = list(replay.read_games(path))
+    finally:
+        os.remove(path)
+    if len(read) != len(games):
+        return failures + [f'replay log: wrote {len(games)} games, read {len(read)}']
+    for i, ((n_rows, n_cols, seed, mines, moves, result), game) in enumerate(zip(games, read)):
+        moves = np.asarray(moves, dtype=np.int64).reshape(-1, 2)
+        header = (n_rows, n_cols, len(mines), seed, result)
+        if ((game.n_rows, game.n_cols, game.n_mines, game.seed, game.result) != header
+                or not np.array_equal(game.mines, np.sort(mines)) or not np.array_equal(game.actions, moves[:, 0])
+                or not np.array_equal(game.cells, moves[:, 1])):
+            failures.append(f'replay log: game {i} read back differently')
+    return failures
+
+
+def check_probabilities(seed: int = 0, n_positions: int = 60) -> list:
+    # ProbabilitySolver's mine probabilities (the exact component counts of _count_exact, combined with the interior
+    # by _probabilities) against every layout that fits the revealed numbers, on small positions part way through
+    # seeded 5x5 games
+    failures = []
+    for position in range(seed, seed + n_positions):
+        rng = np.random.default_rng(position)
+        board = Board(5, 5, int(rng.integers(3, 8)))
+        start = int(rng.integers(board.n_cells))
+        board.place_mines(start, rng)
+        board.reveal(start)
+        for _ in range(int(rng.integers(4))):
+            safe = np.flatnonzero(~board.revealed & ~board.mines)
+            if board.result() or not safe.size:
+                break
+            board.reveal(int(rng.choice(safe)))
+        if board.result():
+            continue
+
+        unknown = np.flatnonzero(~board.revealed).tolist()
+        numbers = [(set(board.neighbors(cell).tolist()), int(board.counts[cell]))
+                   for cell in np.flatnonzero(board.revealed).tolist()]
+        n_layouts = 0
+        n_mine = np.zeros(board.n_cells)
+        for layout in itertools.combinations(unknown, board.n_mines):
+            layout = set(layout)
+            if all(len(cells & layout) == n for cells, n in numbers):
+                n_layouts += 1
+                n_mine[list(layout)] += 1
+        expected = n_mine[unknown] / n_layouts
+        probabilities = ProbabilitySolver(random.Random(position)).mine_probabilities(board)[unknown]
+        if not np.allclose(probabilities, expected, atol=1e-6):
+            worst = int(np.argmax(np.abs(probabilities - expected)))
+            failures.append(f'position {position}: cell {unknown[worst]} has probability {probabilities[worst]:.6f}, '
+                            f'brute force gives {expected[worst]:.6f}')
+    return failures
+
+
+CHECKS = {'replay_roundtrip': check_replay_roundtrip, 'probabilities': check_probabilities}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the correctness checks.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--filter', default=None, help='only run checks whose name contains this')
+    args = parser.parse_args(argv)
+
+    n_failed = 0
+    for name, check in CHECKS.items():
+        if args.filter and args.filter not in name:
+            continue
+        failures = check(args.seed)
+        print(f'{name:<30}{"ok" if not failures else "FAILED"}')
+        for failure in failures:
+            print(f'    {failure}')
+        n_failed += bool(failures)
+    return int(n_failed > 0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
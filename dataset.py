@@ -0,0 +1,148 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+from mines import Grid, difficulties
+from solver import ProbabilitySolver, Solver
+
+# A dataset is a directory of shards plus dataset.json describing how it was made. Shard i holds shard_size samples
+# (the last one may hold fewer) as three .npy files that np.load can memory map:
+#   shard-<i>.obs.npy     int8 (n, n_rows, n_cols)  what the player saw before a move (see Grid.observation)
+#   shard-<i>.labels.npy  per-cell target: 'mines' labels are 1 under every mine (int8), 'prob' labels are the exact
+#                         chance of a mine under each cell given what is visible (float32)
+#   shard-<i>.moves.npy   int32 (n, 2)  the (action, cell id) the solver then made
+# Shard i plays games with seeds seed + i * SEED_STRIDE, seed + i * SEED_STRIDE + 1, ... until it is full, so every
+# shard can be built independently, in any order, and rebuilt identically.
+SEED_STRIDE = 1000000
+LABELS = ('mines', 'prob')
+
+
+def _shard_path(out_dir: str, shard: int, name: str) -> str:
+    return os.path.join(out_dir, f'shard-{shard:05d}.{name}.npy')
+
+
+def shard_done(out_dir: str, shard: int) -> bool:
+    # The obs file is moved into place last, so its presence means the whole shard is there
+    return os.path.exists(_shard_path(out_dir, shard, 'obs'))
+
+
+def write_shard(out_dir: str, shard: int, n_samples: int, dims, num_mines: int, solver_type: str, label: str,
+                seed: int) -> int:
+    # Play games into one shard. Samples go straight into memory-mapped files, so memory use does not grow with the
+    # shard size. Files are written under temporary names and renamed once complete. Returns the games played.
+    n_rows, n_cols = dims
+    paths = {name: _shard_path(out_dir, shard, name) for name in ('labels', 'moves', 'obs')}
+    label_dtype = np.int8 if label == 'mines' else np.float32
+    arrays = {'obs': np.lib.format.open_memmap(paths['obs'] + '.tmp', 'w+', np.int8, (n_samples, n_rows, n_cols)),
+              'labels': np.lib.format.open_memmap(paths['labels'] + '.tmp', 'w+', label_dtype,
+                                                  (n_samples, n_rows, n_cols)),
+              'moves': np.lib.format.open_memmap(paths['moves'] + '.tmp', 'w+', np.int32, (n_samples, 2))}
+    obs, labels, moves = arrays['obs'], arrays['labels'], arrays['moves']
+
+    n = 0
+    n_games = 0
+    while n < n_samples:
+        game_seed = seed + shard * SEED_STRIDE + n_games
+        solver = Solver(solver_type, seed=game_seed)
+        labeller = ProbabilitySolver(random.Random(game_seed)) if label == 'prob' else None
+        grid = Grid(dims, num_mines, headless=True, solver=solver, seed=game_seed)
+        board = grid.board
+        done = False
+        while not done and n < n_samples:
+            action, cell = solver.get_move(grid)
+            # Until the first reveal there are no mines to label
+            if board.has_mines:
+                obs[n] = grid.observation()
+                if labeller is None:
+                    labels[n] = board.grid_view(board.mines)
+                else:
+                    labels[n] = board.grid_view(labeller.mine_probabilities(board))
+                moves[n] = action, cell
+                n += 1
+            _, _, done, _ = grid.step(action, cell)
+        n_games += 1
+
+    for arr in arrays.values():
+        arr.flush()
+    del obs, labels, moves, arrays
+    for name in ('labels', 'moves', 'obs'):
+        os.replace(paths[name] + '.tmp', paths[name])
+    return n_games
+
+
+def _write_shard(job):
+    t0 = time.perf_counter()
+    n_games = write_shard(*job)
+    return job[1], job[2], n_games, time.perf_counter() - t0
+
+
+def export(out_dir: str, difficulty: str, n_samples: int, solver_type='prob', label='mines', shard_size=65536, seed=0,
+           processes=None, log=print):
+    # Build (or finish building) a dataset of n_samples samples in out_dir. Shards already on disk are kept, so an
+    # interrupted export picks up where it stopped when run again with the same settings.
+    if label not in LABELS:
+        raise ValueError(f'label must be one of {LABELS}, not {label!r}')
+    config = {'difficulty': difficulty, 'dims': list(difficulties[difficulty]['dims']),
+              'num_mines': difficulties[difficulty]['num_mines'], 'solver': solver_type, 'label': label,
+              'samples': n_samples, 'shard_size': shard_size, 'seed': seed}
+    os.makedirs(out_dir, exist_ok=True)
+    config_path = os.path.join(out_dir, 'dataset.json')
+    if os.path.exists(config_path):
+        with open(config_path) as f:
+            existing = json.load(f)
+        if existing != config:
+            raise ValueError(f'{out_dir} holds a dataset made with different settings: {existing}')
+    else:
+        with open(config_path, 'w') as f:
+            json.dump(config, f, indent=2)
+
+    n_shards = -(-n_samples // shard_size)
+    jobs = [(out_dir, shard, min(shard_size, n_samples - shard * shard_size), config['dims'], config['num_mines'],
+             solver_type, label, seed)
+            for shard in range(n_shards) if not shard_done(out_dir, shard)]
+    log(f'{n_shards - len(jobs)} of {n_shards} shards already done')
+    if not jobs:
+        return
+    processes = min(processes or os.cpu_count() or 1, len(jobs))
+    with multiprocessing.get_context('spawn').Pool(processes) as pool:
+        for i, (shard, n, n_games, seconds) in enumerate(pool.imap_unordered(_write_shard, jobs), 1):
+            log(f'shard {shard}: {n} samples from {n_games} games in {seconds:.1f}s ({i}/{len(jobs)})')
+
+
+def load(out_dir: str):
+    # The dataset's shards as a list of (obs, labels, moves), memory mapped rather than read into memory
+    shards = []
+    shard = 0
+    while shard_done(out_dir, shard):
+        shards.append(tuple(np.load(_shard_path(out_dir, shard, name), mmap_mode='r')
+                            for name in ('obs', 'labels', 'moves')))
+        shard += 1
+    return shards
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export (observation, label) training samples from solver games.')
+    parser.add_argument('out_dir')
+    parser.add_argument('difficulty', choices=sorted(difficulties))
+    parser.add_argument('--samples', type=int, default=1000000)
+    parser.add_argument('--solver', default='prob', help="solver that plays the games: 'logic', 'prob' or 'rl'")
+    parser.add_argument('--label', choices=LABELS, default='mines')
+    parser.add_argument('--shard-size', type=int, default=65536, help='samples per shard')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=None, help='worker processes (default: one per core)')
+    args = parser.parse_args(argv)
+    try:
+        export(args.out_dir, args.difficulty, args.samples, args.solver, args.label, args.shard_size, args.seed,
+               args.processes)
+    except ValueError as e:
+        parser.error(str(e))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,26 +1,33 @@
-import random
+import copy
+import numbers
 import sys
-import pygame
-from pygame.locals import *
+from functools import lru_cache
 import time
 
-# Initialize pygame
-pygame.init()
+import numpy as np
+
+import noguess
+from board import Board, FLAGGED, MINE, UNKNOWN
+from solver import Solver
+
+# pygame is imported and started by init_graphics, the first time something is displayed. Until then importing this
+# module, or playing headless, needs no display and loads no fonts.
+pygame = None
 
 # Colors
-BLACK = pygame.Color(0, 0, 0)
-WHITE = pygame.Color(255, 255, 255)
-GREY = pygame.Color(128, 128, 128)
-LIGHT_GREY = pygame.Color(200, 200, 200)
-RED = pygame.Color(255, 0, 0)
-GREEN = pygame.Color(0, 255, 0)
-BLUE = pygame.Color(0, 0, 255)
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+GREY = (128, 128, 128)
+LIGHT_GREY = (200, 200, 200)
+RED = (255, 0, 0)
+GREEN = (0, 255, 0)
+BLUE = (0, 0, 255)
 background_color = BLACK
-mines_rem_bg_color = pygame.Color(200, 30, 30)
+mines_rem_bg_color = (200, 30, 30)
 mines_rem_font_color = BLACK
-unk_rem_bg_color = pygame.Color(200, 100, 30)
+unk_rem_bg_color = (200, 100, 30)
 unk_rem_font_color = BLACK
-timer_bg_color = pygame.Color(30, 200, 100)
+timer_bg_color = (30, 200, 100)
 timer_font_color = BLACK
 border_color = BLUE
 unknown_box_color = GREY
@@ -28,11 +35,11 @@ known_box_color = LIGHT_GREY
 mine_box_color = RED
 
 num_colors = {1: BLUE,
-              2: pygame.Color(0, 200, 0),
+              2: (0, 200, 0),
               3: RED,
-              4: pygame.Color(0, 0, 128),
-              5: pygame.Color(128, 0, 0),
-              6: pygame.Color(0, 128, 128),
+              4: (0, 0, 128),
+              5: (128, 0, 0),
+              6: (0, 128, 128),
               7: BLACK,
               8: GREY}
 
@@ -40,9 +47,9 @@ num_colors = {1: BLUE,
 LEFT = 1
 RIGHT = 3
 
-# Frames-per-second limit
-FPS = pygame.time.Clock()
-FPS_LIMIT = 60
+# Events the game loop sets timers for: the scoreboard clock's tick, and the reset after a game ends
+CLOCK_EVENT = None
+RESET_EVENT = None
 
 # Pixel size of individual boxes
 box_size = 24
@@ -51,29 +58,93 @@ box_size = 24
 min_win_width = 350
 min_win_height = 200
 
+# Maximum window dimensions. Boards too big to fit are shown through a scrolling, zoomable viewport.
+max_win_width = 1280
+max_win_height = 800
+
+# Box sizes the viewport can zoom between, and the smallest that still shows numbers
+ZOOM_SIZES = (2, 4, 6, 8, 12, 16, 24, 32, 39)
+MIN_NUMBER_SIZE = 12
+
 # Font properties
-font = pygame.font.SysFont('segoeui', 18, True)
-sb_font = pygame.font.SysFont('segoeui', 18)
+font = None
+sb_font = None
 
 # Time (seconds) before next game
 RESET_TIME = 0.5
 
+# Solves to try when making a no-guess layout on the first click, with no pooled one to hand. Each takes ~1ms on
+# expert, so a dense board that would never yield one falls back to a random layout after ~0.1s rather than seconds.
+NO_GUESS_ATTEMPTS = 100
+
+# Screen areas drawn to since the display was last updated. Drawing only records its rect here; the main loop pushes
+# them all to the screen once per frame.
+dirty_rects = []
+
+# Past this many dirty rects, updating their bounding box is cheaper than updating each one
+MAX_DIRTY_RECTS = 64
+
+# Surfaces blitted so far, counted where the blits happen (for profiling)
+n_blits = 0
+
+
+def flush_display(full=False):
+    # Push the dirty rects to the screen, or the whole window if full
+    if full:
+        pygame.display.update()
+    elif len(dirty_rects) > MAX_DIRTY_RECTS:
+        pygame.display.update(dirty_rects[0].unionall(dirty_rects[1:]))
+    elif dirty_rects:
+        pygame.display.update(dirty_rects)
+    dirty_rects.clear()
+
+
+def init_graphics():
+    global pygame, CLOCK_EVENT, RESET_EVENT, font, sb_font
+    if pygame is None:
+        import pygame
+        pygame.init()
+        CLOCK_EVENT = pygame.event.custom_type()
+        RESET_EVENT = pygame.event.custom_type()
+        font = pygame.font.SysFont('segoeui', 18, True)
+        sb_font = pygame.font.SysFont('segoeui', 18)
+
+
+# Pre-rendered tiles shared by every box, keyed by (size, color, number), so drawing a box is a single blit
+_tiles = {}
 
-# TODO  I need to remove the dependence on pixels and pixel coordinates to define and interact with a box - interaction
-#       should only be through an indexing system of some sort
+
+def get_tile(dim: int, color: tuple, number: int = 0) -> 'pygame.Surface':
+    global n_blits
+    key = (dim, tuple(color), number)
+    tile = _tiles.get(key)
+    if tile is None:
+        tile = pygame.Surface((dim, dim))
+        tile.fill(color)
+        if number:
+            num = font.render(str(number), True, num_colors[number])
+            tile.blit(num, num.get_rect(center=(dim // 2, dim // 2)))
+            n_blits += 1
+        _tiles[key] = tile
+    return tile
+
+
+@lru_cache(maxsize=256)
+def render_text(text: str, color: tuple, bg_color: tuple) -> 'pygame.Surface':
+    # Scoreboard text, rendered once per distinct string
+    return sb_font.render(text, True, color, bg_color)
 
 
 class BoxGraphics:
-    def __init__(self, x: int, y: int, dim: int, display_surf: pygame.Surface, color: pygame.Color):
+    def __init__(self, x: int, y: int, dim: int, display_surf: 'pygame.Surface', color: tuple):
         self._x = x
         self._y = y
         self._dim = dim
         self.display_surf = display_surf
         self.color = color
-        self.surf = pygame.Surface((self.dim, self.dim))
-        self.surf.fill(self.color)
-        self.rect = self.surf.get_rect(center=(int(self.x + self.dim / 2), int(self.y + self.dim / 2)))
-        self.display_surf.blit(self.surf, self.rect)
+        self.surf = get_tile(self.dim, self.color)
+        self.rect = pygame.Rect(self.x, self.y, self.dim, self.dim)
+        self._blit()
 
     @property
     def x(self):
@@ -103,90 +174,124 @@ class BoxGraphics:
         self.dim = new_dim
 
     def show_number(self, n_neighbors):
-        num = font.render(str(n_neighbors), True, num_colors[n_neighbors])
-        width = num.get_rect().width
-        height = num.get_rect().height
-        left = int((self.rect.width - width) / 2)
-        top = int((self.rect.height - height) / 2)
-        num.get_rect().update((left, top), (width, height))
-        self.surf.blit(num, pygame.Rect(left, top, width, height))
-        self.display_surf.blit(self.surf, self.rect)
+        # Shows the number on a revealed box
+        self.color = known_box_color
+        self.surf = get_tile(self.dim, self.color, n_neighbors)
+        self._blit()
 
     def update_color(self, color):
         self.color = color
-        self.surf.fill(self.color)
+        self.surf = get_tile(self.dim, self.color)
+        self._blit()
+
+    def _blit(self):
+        global n_blits
         self.display_surf.blit(self.surf, self.rect)
+        n_blits += 1
+        dirty_rects.append(self.rect)
 
 
 class Box:
-    def __init__(self, box_id, box_graphics_obj):
+    # A Box is a view of a single cell of a Board; all game state lives in the Board's arrays. Changes go through
+    # the Board, which keeps its counters up to date; the mine layout cannot be changed through a Box.
+    def __init__(self, box_id, board, box_graphics_obj=None):
         self._id = box_id
+        self.board = board
         self.graphics_obj = box_graphics_obj
-        self.is_mine = False
-        self.is_revealed = False
-        self.is_protected = False
-        self.n_neighbors = 0
+
+    @property
+    def is_mine(self):
+        return bool(self.board.mines[self._id])
+
+    @property
+    def is_revealed(self):
+        return bool(self.board.revealed[self._id])
+
+    @is_revealed.setter
+    def is_revealed(self, value):
+        if value:
+            self.board.reveal_cell(self._id)
+        elif self.is_revealed:
+            raise ValueError('A revealed box cannot be hidden again.')
+
+    @property
+    def is_protected(self):
+        return bool(self.board.flagged[self._id])
+
+    @is_protected.setter
+    def is_protected(self, value):
+        if bool(value) != self.is_protected:
+            self.board.toggle_flag(self._id)
+
+    @property
+    def n_neighbors(self):
+        return int(self.board.counts[self._id])
 
     def get_id(self):
         return self._id
 
     def reveal(self):
         if not self.is_revealed and not self.is_protected:
-            self.is_revealed = True
+            self.board.reveal_cell(self._id)
+            if self.graphics_obj is not None:
+                self.draw()
+        return self.n_neighbors if not self.is_mine else -1
+
+    def draw(self):
+        # Redraw the box to match the state of its cell
+        if self.is_revealed:
             if self.is_mine:
                 self._update_color(mine_box_color)
+            elif self.n_neighbors > 0:
+                self._show_number()
             else:
                 self._update_color(known_box_color)
-                if self.n_neighbors > 0:
-                    self._show_number()
-            pygame.display.update()
-        return self.n_neighbors if not self.is_mine else -1
+        else:
+            self._update_color(BLUE if self.is_protected else GREY)
 
     def _update_color(self, color):
         self.graphics_obj.update_color(color)
 
     def toggle_protect(self):
         if not self.is_revealed:
-            if not self.is_protected:
-                self.is_protected = True
-                self._update_color(BLUE)
-            else:
-                self.is_protected = False
-                self._update_color(GREY)
-            return self.is_mine, self.is_protected
+            is_protected = self.board.toggle_flag(self._id)
+            if self.graphics_obj is not None:
+                self._update_color(BLUE if is_protected else GREY)
+            return self.is_mine, is_protected
         return False, None
 
-    def set_mine(self):
-        self.is_mine = True
-
     def _show_number(self):
         self.graphics_obj.show_number(self.n_neighbors)
 
-    def get_neighbor_ids(self, neighbor_info):
-        n_rows, n_cols, width_start, height_start, width_step, height_step = neighbor_info
-        col = int((self.graphics_obj.x - width_start) / width_step)
-        row = int((self.graphics_obj.y - height_start) / height_step)
-        ids = []
-        for r in range(row - 1, row + 2):
-            if r < 0 or r >= n_rows:
-                continue
-            for c in range(col - 1, col + 2):
-                if c < 0 or c >= n_cols or (r == row and c == col):
-                    continue
-                ids.append(c * n_rows + r)
-        return ids
+    def get_neighbor_ids(self):
+        return self.board.neighbors(self._id)
 
 
 class Grid:
-    def __init__(self, dims, num_mines, _box_size=39, offsets=(10, 50, 10), headless=False, solver=None):
+    def __init__(self, dims, num_mines, _box_size=39, offsets=(10, 50, 10), headless=False, solver=None, seed=None,
+                 viewport=None, replay_log=None, no_guess=False, pool_dir=None):
         self.headless = headless
         self.solver = solver
+        # Every game has an integer seed, drawn at random if none is given, that makes its generator and is recorded
+        # with it. Games after the first get their own, derived from the first one's (see reset).
+        if seed is None:
+            seed = int(np.random.SeedSequence().generate_state(1)[0])
+        self.seed = int(seed) if isinstance(seed, numbers.Integral) else None
+        self.rng = np.random.default_rng(seed)
+        self._first_seed = self.seed
+        self._n_games = 0
+        # Moves made this game, as (action, box id), and an optional replay.ReplayWriter to save finished games to
+        self.history = []
+        self.replay_log = replay_log
+        # Whether to only deal layouts that can be won without guessing (see noguess), where their pool is kept, and
+        # whether this game's layout is one (it is not if none could be drawn or made in time)
+        self.no_guess = no_guess
+        self.pool_dir = pool_dir
+        self.layout_no_guess = False
         self.boxes = {}
+        self.board = Board(dims[0], dims[1], num_mines)
+        self._boxes_by_id = [None] * self.board.n_cells
         self.n_mines = num_mines
-        self.n_mines_protected = 0
-        self.n_unknown = dims[0] * dims[1]
-        self.n_protected = 0
-        self.exploded = False
         self.is_locked = False
         self.n_rows = dims[0]
         self.n_cols = dims[1]
@@ -195,7 +300,15 @@ class Grid:
         self._height_top_offset = offsets[1]
         self._height_bot_offset = offsets[2]
         self._t0 = 0
+        # Part of the board on screen: all of it, unless in viewport mode
+        self.viewport = False
+        self._viewport_arg = viewport
+        self._tile_size = _box_size
+        self._view_row = self._view_col = 0
+        self._n_view_rows = self.n_rows
+        self._n_view_cols = self.n_cols
         if not self.headless:
+            init_graphics()
             window_pad_scale = 1.1
             self._win_width = round(self.n_cols * (box_size + 1) * window_pad_scale) + 2 * self._width_offset
             self._win_width += int(self._win_width % 2)
@@ -204,10 +317,28 @@ class Grid:
                                 + self._height_bot_offset)
             self._win_height += int(self._win_height % 2)
             self._win_height = max(self._win_height, min_win_height)
+            # Boards that do not fit the screen (or any board, if asked) are drawn a window-full at a time
+            if viewport is None:
+                viewport = self._win_width > max_win_width or self._win_height > max_win_height
+            self.viewport = viewport
+            if self.viewport:
+                self._win_width = min(self._win_width, max_win_width)
+                self._win_height = min(self._win_height, max_win_height)
             self.display_surf = pygame.display.set_mode((self._win_width, self._win_height))
             self.display_surf.fill(background_color)
             pygame.display.set_caption("Paul's Extreme Minesweeper")
         self._make_board()
+        if no_guess:
+            # A pre-generated layout comes with its own start cell, so the game starts with it already opened
+            layout = noguess.draw(self.n_rows, self.n_cols, num_mines, self.rng, pool_dir or noguess.POOL_DIR)
+            if layout is not None:
+                start_cell, mine_ids = layout
+                self.board.set_mines(mine_ids)
+                self.layout_no_guess = True
+                self.history.append((0, start_cell))
+                self._reveal_id(start_cell)
+                if not self.headless:
+                    self._update_scoreboard()
 
     def _make_board(self):
         if not self.headless:
@@ -221,6 +352,10 @@ class Grid:
             pygame.draw.line(self.display_surf, border_color, nw, sw)  # LEFT
             pygame.draw.line(self.display_surf, border_color, ne, se)  # RIGHT
 
+        if self.viewport:
+            # Only the cells on screen are drawn, straight from the board's visible state, so no boxes have graphics
+            self._set_zoom(self._box_size)
+        elif not self.headless:
             # Define pixel dimensions of grid
             self.height_start = self._height_top_offset + int((self._win_height - self._height_top_offset
                                                                - self._height_bot_offset
@@ -231,26 +366,145 @@ class Grid:
             self.width_stop = self._win_width - self.width_start - self.n_cols % 2
             self.width_step = self.height_step = self._box_size + 1
 
-        # TODO this is where the pixel dependency needs to be replaced
-        # Create Boxes in a grid and assign each a unique ID
-        box_id = 0
-        for i in range(self.width_start, self.width_stop, self.width_step):
-            for j in range(self.height_start, self.height_stop, self.height_step):
-                if not self.headless:
-                    graphics_obj = BoxGraphics(i, j, self._box_size, self.display_surf, color=unknown_box_color)
-                else:
-                    graphics_obj = None
-                self.boxes[(int((i - self.width_start) / self.width_step),
-                            int((j - self.height_start) / self.height_step))] = Box(box_id, graphics_obj)
-                box_id += 1
+            # Create a view onto each cell of the board, along with its graphics
+            for col in range(self.n_cols):
+                for row in range(self.n_rows):
+                    graphics_obj = BoxGraphics(self.width_start + col * self.width_step,
+                                               self.height_start + row * self.height_step,
+                                               self._box_size, self.display_surf, color=unknown_box_color)
+                    box_id = self.board.cell_id(row, col)
+                    self.boxes[(col, row)] = self._boxes_by_id[box_id] = Box(box_id, self.board, graphics_obj)
+            self._update_neighbor_info()
+        else:
+            # Without a display there are no pixels, so cells are addressed purely by their index. Boxes are not
+            # created up front; _id_to_box creates (and indexes) views on demand.
+            self.width_start = self.height_start = 0
+            self.width_step = self.height_step = 1
+            self._update_neighbor_info()
+
+        # Draw scoreboard
+        if not self.headless:
+            self._make_scoreboard()
+
+    # Game state is counted by the board as it changes
+    @property
+    def n_mines_protected(self):
+        return self.board.n_mines_flagged
+
+    @property
+    def n_protected(self):
+        return self.board.n_flagged
+
+    @property
+    def n_unknown(self):
+        return self.board.n_unknown
+
+    @property
+    def exploded(self):
+        return self.board.exploded
 
+    def _update_neighbor_info(self):
         # Save info needed to calculate neighbors for convenience
         self.neighbor_info = (self.n_rows, self.n_cols, self.width_start, self.height_start,
                               self.width_step, self.height_step)
 
-        # Draw scoreboard
-        if not self.headless:
-            self._make_scoreboard()
+    def _view_area(self):
+        # Inside of the border drawn around the grid
+        return pygame.Rect(self._width_offset + 1, self._height_top_offset + 1,
+                           self._win_width - 2 * self._width_offset - 1,
+                           self._win_height - self._height_top_offset - self._height_bot_offset - 1)
+
+    def _set_zoom(self, size, center=None):
+        # Show boxes of the given pixel size in viewport mode, keeping the cell at center (row, col) in the middle
+        self._tile_size = size
+        self.width_step = self.height_step = size + 1
+        area = self._view_area()
+        self._n_view_cols = min(self.n_cols, area.width // self.width_step)
+        self._n_view_rows = min(self.n_rows, area.height // self.height_step)
+        self.width_start = area.left + (area.width - self._n_view_cols * self.width_step) // 2
+        self.height_start = area.top + (area.height - self._n_view_rows * self.height_step) // 2
+        number_size = size if size >= MIN_NUMBER_SIZE else 0
+        self._view_tiles = {UNKNOWN: get_tile(size, unknown_box_color), FLAGGED: get_tile(size, BLUE),
+                            MINE: get_tile(size, mine_box_color), 0: get_tile(size, known_box_color)}
+        for n in range(1, 9):
+            self._view_tiles[n] = get_tile(size, known_box_color, n if number_size else 0)
+        if center is not None:
+            self._view_row = center[0] - self._n_view_rows // 2
+            self._view_col = center[1] - self._n_view_cols // 2
+        self._scroll(0, 0)
+
+    def _zoom(self, direction):
+        sizes = [size for size in ZOOM_SIZES if (size > self._tile_size if direction > 0 else size < self._tile_size)]
+        if sizes:
+            center = (self._view_row + self._n_view_rows // 2, self._view_col + self._n_view_cols // 2)
+            self._set_zoom(sizes[0] if direction > 0 else sizes[-1], center)
+
+    def _scroll(self, d_rows, d_cols):
+        self._view_row = min(max(self._view_row + d_rows, 0), self.n_rows - self._n_view_rows)
+        self._view_col = min(max(self._view_col + d_cols, 0), self.n_cols - self._n_view_cols)
+        self._update_neighbor_info()
+        self._draw_view()
+
+    def _draw_view(self):
+        # Redraw every cell in the viewport
+        global n_blits
+        area = self._view_area()
+        self.display_surf.fill(background_color, area)
+        visible = self.board.visible_grid[self._view_row:self._view_row + self._n_view_rows,
+                                          self._view_col:self._view_col + self._n_view_cols]
+        tiles = self._view_tiles
+        blits = []
+        for row, values in enumerate(visible.tolist()):
+            y = self.height_start + row * self.height_step
+            blits.extend((tiles[value], (self.width_start + col * self.width_step, y))
+                         for col, value in enumerate(values))
+        self.display_surf.blits(blits, doreturn=False)
+        n_blits += len(blits)
+        dirty_rects.append(area)
+
+    def _handle_view_event(self, event):
+        # Scroll with the arrow keys or WASD and zoom with the mouse wheel or +/-. Returns whether the event was used.
+        if event.type == pygame.MOUSEWHEEL:
+            self._zoom(event.y)
+        elif event.type == pygame.KEYDOWN:
+            d_rows = max(self._n_view_rows // 4, 1)
+            d_cols = max(self._n_view_cols // 4, 1)
+            if event.key in (pygame.K_LEFT, pygame.K_a):
+                self._scroll(0, -d_cols)
+            elif event.key in (pygame.K_RIGHT, pygame.K_d):
+                self._scroll(0, d_cols)
+            elif event.key in (pygame.K_UP, pygame.K_w):
+                self._scroll(-d_rows, 0)
+            elif event.key in (pygame.K_DOWN, pygame.K_s):
+                self._scroll(d_rows, 0)
+            elif event.key in (pygame.K_EQUALS, pygame.K_PLUS, pygame.K_KP_PLUS):
+                self._zoom(1)
+            elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                self._zoom(-1)
+            else:
+                return False
+        else:
+            return False
+        return True
+
+    def _draw_cells(self, cells):
+        # Redraw the given cells to match the board
+        global n_blits
+        if not self.viewport:
+            for box_id in cells:
+                self._id_to_box(box_id).draw()
+            return
+        cells = np.asarray(cells)
+        cols, rows = np.divmod(cells, self.n_rows)
+        rows -= self._view_row
+        cols -= self._view_col
+        on_screen = (rows >= 0) & (rows < self._n_view_rows) & (cols >= 0) & (cols < self._n_view_cols)
+        visible = self.board.visible
+        n_blits += int(on_screen.sum())
+        for cell, row, col in zip(cells[on_screen].tolist(), rows[on_screen].tolist(), cols[on_screen].tolist()):
+            dirty_rects.append(self.display_surf.blit(self._view_tiles[int(visible[cell])],
+                                                      (self.width_start + col * self.width_step,
+                                                       self.height_start + row * self.height_step)))
 
     def _start_timer(self):
         self._t0 = time.time()
@@ -262,140 +516,184 @@ class Grid:
         return timer_min, timer_sec
 
     def _make_scoreboard(self):
-        # Scoreboard surface
-        self.sb_left_surf = pygame.Surface((int((self._win_width - 2 * self._width_offset) / 3.),
-                                            self._height_top_offset - 2 * self._width_offset))
-        self.sb_middle_surf = pygame.Surface((int((self._win_width - 2 * self._width_offset) / 3.),
-                                              self._height_top_offset - 2 * self._width_offset))
-        self.sb_right_surf = pygame.Surface((int((self._win_width - 2 * self._width_offset) / 3.),
-                                             self._height_top_offset - 2 * self._width_offset))
-        self.sb_left_surf.fill(mines_rem_bg_color)
-        self.sb_middle_surf.fill(unk_rem_bg_color)
-        self.sb_right_surf.fill(timer_bg_color)
-        # Mines remaining
-        self.mines_rem_str = f'Mines: {self.n_mines - self.n_mines_protected} / {self.n_mines}'
-        self.mines_rem_surf = sb_font.render(self.mines_rem_str, True, mines_rem_font_color, mines_rem_bg_color)
-        width = self.mines_rem_surf.get_rect().width
-        height = self.mines_rem_surf.get_rect().height
-        left = int((self.sb_left_surf.get_rect().width - width) / 2)
-        top = int((self.sb_left_surf.get_rect().height - height) / 2)
-        self.mines_rem_dims = (left, top, width, height)
-        self.mines_rem_surf.get_rect().update(self.mines_rem_dims)
-        # Unknown boxes remaining
-        self.unk_rem_str = f'Unk: {self.n_unknown} / {self.n_rows * self.n_cols}'
-        self.unk_rem_surf = sb_font.render(self.unk_rem_str, True, unk_rem_font_color, unk_rem_bg_color)
-        width = self.unk_rem_surf.get_rect().width
-        height = self.unk_rem_surf.get_rect().height
-        left = int((self.sb_middle_surf.get_rect().width - width) / 2)
-        top = int((self.sb_middle_surf.get_rect().height - height) / 2)
-        self.unk_rem_dims = (left, top, width, height)
-        self.unk_rem_surf.get_rect().update(self.unk_rem_dims)
-        # Timer
-        timer_min, timer_sec = self._start_timer()
-        self.timer_str = '{}:{}'.format(timer_min, str(timer_sec).zfill(2))
-        self.timer_surf = sb_font.render(self.timer_str, True, timer_font_color, timer_bg_color)
-        width = self.timer_surf.get_rect().width
-        height = self.timer_surf.get_rect().height
-        left = int((self.sb_right_surf.get_rect().width - width) / 2)
-        top = int((self.sb_right_surf.get_rect().height - height) / 2)
-        self.timer_dims = (left, top, width, height)
-        self.timer_surf.get_rect().update(self.timer_dims)
+        # Scoreboard panels: mines remaining, unknown boxes remaining and the timer, left to right
+        panel_width = int((self._win_width - 2 * self._width_offset) / 3.)
+        panel_size = (panel_width, self._height_top_offset - 2 * self._width_offset)
+        self.sb_left_surf = pygame.Surface(panel_size)
+        self.sb_middle_surf = pygame.Surface(panel_size)
+        self.sb_right_surf = pygame.Surface(panel_size)
+        self._sb_panels = ((self.sb_left_surf, mines_rem_font_color, mines_rem_bg_color,
+                            (self._width_offset, self._width_offset)),
+                           (self.sb_middle_surf, unk_rem_font_color, unk_rem_bg_color,
+                            (self._width_offset + int((self._win_width - 2 * self._width_offset) / 3.),
+                             self._width_offset)),
+                           (self.sb_right_surf, timer_font_color, timer_bg_color,
+                            (self._width_offset + int((self._win_width - 2 * self._width_offset) * 2 / 3.),
+                             self._width_offset)))
+        # Text currently shown on each panel, so that unchanged panels are not redrawn
+        self._sb_shown = [None] * len(self._sb_panels)
+        self._start_timer()
         # Make text
         self._update_scoreboard()
 
     def _update_scoreboard(self):
-        # First, remove current text
-        # Mines remaining
-        self.mines_rem_surf = sb_font.render(self.mines_rem_str, True, mines_rem_bg_color, mines_rem_bg_color)
-        self.sb_left_surf.blit(self.mines_rem_surf, self.mines_rem_dims)
-        self.display_surf.blit(self.sb_left_surf, (self._width_offset, self._width_offset))
-        self.mines_rem_str = f'Mines: {self.n_mines - self.n_mines_protected} / {self.n_mines}'
-        self.mines_rem_surf = sb_font.render(self.mines_rem_str, True, mines_rem_font_color, mines_rem_bg_color)
-
-        # Unknown boxes remaining
-        self.unk_rem_surf = sb_font.render(self.unk_rem_str, True, unk_rem_bg_color, unk_rem_bg_color)
-        self.sb_middle_surf.blit(self.unk_rem_surf, self.unk_rem_dims)
-        self.display_surf.blit(self.sb_middle_surf,
-                               (self._width_offset + int((self._win_width - 2 * self._width_offset) / 3.),
-                                self._width_offset))
+        # Counts flags rather than correctly flagged mines, which would give the mines away
+        global n_blits
+        self.mines_rem_str = f'Mines: {self.n_mines - self.n_protected} / {self.n_mines}'
         self.unk_rem_str = f'Unk: {self.n_unknown} / {self.n_rows * self.n_cols}'
-        self.unk_rem_surf = sb_font.render(self.unk_rem_str, True, unk_rem_font_color, unk_rem_bg_color)
-
-        # Timer
-        self.timer_surf = sb_font.render(self.timer_str, True, timer_bg_color, timer_bg_color)
-        self.sb_right_surf.blit(self.timer_surf, self.timer_dims)
-        self.display_surf.blit(self.sb_right_surf,
-                               (self._width_offset + int((self._win_width - 2 * self._width_offset) * 2 / 3.),
-                                self._width_offset))
         timer_min, timer_sec = self._update_timer()
         self.timer_str = '{}:{}'.format(timer_min, str(timer_sec).zfill(2))
-        self.timer_surf = sb_font.render(self.timer_str, True, timer_font_color, timer_bg_color)
-
-        # Next, add the new text
-        self.sb_left_surf.blit(self.mines_rem_surf, self.mines_rem_dims)
-        self.sb_middle_surf.blit(self.unk_rem_surf, self.unk_rem_dims)
-        self.sb_right_surf.blit(self.timer_surf, self.timer_dims)
-
-        # Put scoreboard on display
-        self.display_surf.blit(self.sb_left_surf,   (self._width_offset, self._width_offset))
-        self.display_surf.blit(self.sb_middle_surf,
-                               (self._width_offset + int((self._win_width - 2 * self._width_offset) / 3.),
-                                self._width_offset))
-        self.display_surf.blit(self.sb_right_surf,
-                               (self._width_offset + int((self._win_width - 2 * self._width_offset) * 2 / 3.),
-                                self._width_offset))
-
-    def reset(self):
+
+        for i, text in enumerate((self.mines_rem_str, self.unk_rem_str, self.timer_str)):
+            if text == self._sb_shown[i]:
+                continue
+            self._sb_shown[i] = text
+            surf, font_color, bg_color, pos = self._sb_panels[i]
+            text_surf = render_text(text, tuple(font_color), tuple(bg_color))
+            surf.fill(bg_color)
+            surf.blit(text_surf, text_surf.get_rect(center=surf.get_rect().center))
+            # Put scoreboard on display
+            dirty_rects.append(self.display_surf.blit(surf, pos))
+            n_blits += 2
+
+    def reset(self, seed=None):
+        # Start a new game. Returns the (all unknown) observation, as step does. Without a seed, game n since the last
+        # seed given gets its own, spawned from that seed, so a run of games is reproducible game by game.
+        first_seed, n_games = self._first_seed, self._n_games + 1
+        spawned = seed is None
+        if spawned:
+            seed = int(np.random.SeedSequence(first_seed, spawn_key=(n_games,)).generate_state(1)[0])
         self.__init__((self.n_rows, self.n_cols), self.n_mines, self._box_size,
                       (self._width_offset, self._height_top_offset, self._height_bot_offset),
-                      self.headless, self.solver)
+                      self.headless, self.solver, seed, self._viewport_arg, self.replay_log, self.no_guess,
+                      self.pool_dir)
+        if spawned:
+            self._first_seed, self._n_games = first_seed, n_games
+        return self.observation()
+
+    def clone(self):
+        # A headless copy of the game as it stands, to play on without touching this one (e.g. to try moves out). It
+        # shares the board's mine layout, so it is cheap, and has no display or replay log.
+        clone = object.__new__(Grid)
+        clone.__dict__.update(self.__dict__)
+        clone.board = self.board.clone()
+        clone.history = list(self.history)
+        clone.headless = True
+        clone.viewport = False
+        clone.replay_log = None
+        clone.boxes = {}
+        clone._boxes_by_id = [None] * self.board.n_cells
+        if not self.board.has_mines:
+            # Mines are still to be drawn, and the clone must not draw them from this grid's stream
+            clone.rng = copy.deepcopy(self.rng)
+        return clone
+
+    def snapshot(self):
+        # The state of the game, for restore to go back to
+        return self.board.snapshot(), list(self.history), self.is_locked
+
+    def restore(self, snapshot):
+        board, history, self.is_locked = snapshot
+        self.board.restore(board)
+        self.history = list(history)
+        if not self.headless:
+            if self.viewport:
+                self._draw_view()
+            else:
+                self._draw_cells(range(self.board.n_cells))
+            self._update_scoreboard()
 
-    def expand_neighbors(self, box):
-        neighbor_ids = box.get_neighbor_ids(self.neighbor_info)
-        [self.reveal(self._id_to_box(neighbor_id)) for neighbor_id in neighbor_ids
-         if not self._id_to_box(neighbor_id).is_revealed]
+    def observation(self):
+        # (n_rows, n_cols) view of what the player can see: neighbor counts of revealed cells, otherwise
+        # board.UNKNOWN / board.FLAGGED / board.MINE. This is live board state, so copy it to keep it. It stays live
+        # through snapshot and restore, and clones taken of this grid; a clone's own observation is only good until
+        # its next move, so use the one step returns.
+        return self.board.visible_grid
+
+    def step(self, action: int, box_id: int):
+        # Apply one move by cell id (action 0 reveals, 1 toggles a flag; anything else is ignored and not recorded),
+        # without touching the display or clock. Mines are laid on the first reveal.
+        # Returns (observation, reward, done, info), with a reward of 1 for a win, -1 for a loss and 0 otherwise.
+        revealed = None
+        if not self.is_locked and action in (0, 1):
+            self.history.append((action, box_id))
+            if action == 0:
+                if not self.board.has_mines:
+                    self._place_mines(box_id)
+                revealed = self._reveal_id(box_id)
+            else:
+                self._toggle_protect_id(box_id)
+        result = self._game_result()
+        if result and not self.is_locked:
+            self.is_locked = True
+            self._save_replay()
+        return self.observation(), result, self.is_locked, {'revealed': revealed}
+
+    def _place_mines(self, box_id):
+        # Lay mines around the first reveal. With no pooled layout to hand, a no-guess one is made on the spot; on very
+        # dense boards that may fail, and the game falls back to an ordinary random layout (see layout_no_guess).
+        if self.no_guess:
+            mine_ids = noguess.generate(self.n_rows, self.n_cols, self.n_mines, box_id, self.rng, NO_GUESS_ATTEMPTS)
+            if mine_ids is not None:
+                self.board.set_mines(mine_ids)
+                self.layout_no_guess = True
+                return
+        self.board.place_mines(box_id, self.rng)
 
     def _id_to_box(self, box_id):
-        return [box for box in self.boxes.values() if box.get_id() == box_id][0]
+        box = self._boxes_by_id[box_id]
+        if box is None:
+            box = self._boxes_by_id[box_id] = Box(box_id, self.board)
+        return box
+
+    def _pos_to_box(self, pos):
+        # The box under a pixel position, or None if it is outside the grid or on the 1px gutter between boxes
+        n_rows, n_cols, width_start, height_start, width_step, height_step = self.neighbor_info
+        col, x = divmod(pos[0] - width_start, width_step)
+        row, y = divmod(pos[1] - height_start, height_step)
+        if (0 <= col < self._n_view_cols and 0 <= row < self._n_view_rows and x < self._tile_size
+                and y < self._tile_size):
+            return self._id_to_box(self.board.cell_id(row + self._view_row, col + self._view_col))
+        return None
 
     def reveal(self, box):
-        if not box.is_protected:
-            n_neighbor_mines = box.reveal()
-            self.n_unknown -= 1
-            self.exploded = n_neighbor_mines == -1
-            if n_neighbor_mines == 0:
-                self.expand_neighbors(box)
+        # Reveal the box, flood filling from it if it has no neighboring mines. Returns the newly revealed ids.
+        return self._reveal_id(box.get_id())
+
+    def _reveal_id(self, box_id):
+        revealed = self.board.reveal(box_id)
+        if revealed.size and not self.headless:
+            self._draw_cells(revealed)
+        return revealed
 
     def toggle_protect(self, box):
-        # TODO number of mines does not decrease on scoreboard if an incorrect tile is protected
-        is_mine, is_protected = box.toggle_protect()
-        if is_protected is not None:
-            if is_protected:
-                self.n_mines_protected += int(is_mine)
-                self.n_protected += 1
-                self.n_unknown -= 1
-            else:
-                self.n_mines_protected -= int(is_mine)
-                self.n_protected -= 1
-                self.n_unknown += 1
+        self._toggle_protect_id(box.get_id())
+
+    def _toggle_protect_id(self, box_id):
+        self.board.toggle_flag(box_id)
+        if not self.headless:
+            self._draw_cells([box_id])
+
+    def _game_result(self):
+        # 1 if the game is won, -1 if it is lost, otherwise 0
+        return self.board.result()
 
     def _check_win(self):
+        global n_blits
         win_str, bg_color = None, None
-        if (self.n_mines - self.n_mines_protected <= 0 and self.n_mines_protected == self.n_protected
-                and self.n_unknown == 0):
+        result = self._game_result()
+        if result > 0:
             win_str = 'YOU WIN!'
-            bg_color = GREEN
-            bg_color.a = 100
+            bg_color = GREEN + (100,)
             print('Win!')
-        elif self.exploded:
+        elif result < 0:
             win_str = 'YOU LOSE!'
-            bg_color = RED
-            bg_color.a = 100
+            bg_color = RED + (100,)
             print('Lose!')
         if win_str:
             if not self.headless:
                 win_font = pygame.font.SysFont('segoeui', 48, bold=True)
-                win_font_surf = win_font.render(win_str, True, pygame.Color(0, 0, 0, 255))
+                win_font_surf = win_font.render(win_str, True, BLACK)
                 win_font_size = win_font_surf.get_size()
                 win_bg_surf = pygame.Surface(self.display_surf.get_size(), pygame.SRCALPHA)
                 win_bg_surf.fill(bg_color)
@@ -406,84 +704,33 @@ class Grid:
                 win_bg_surf.blit(win_font_surf, (int((win_bg_surf.get_width() - win_font_size[0]) / 2.),
                                                  int((win_bg_surf.get_height() - win_font_size[1]) / 2.)))
                 self.display_surf.blit(win_bg_surf, (left, top))
-                pygame.display.update()
-            self.is_locked = True
+                n_blits += 2
+                flush_display(full=True)
+            if not self.is_locked:
+                self.is_locked = True
+                self._save_replay()
             return True
         return False
 
-    def _first_move(self):
-        # TODO clean this up to align with the flow of the main loop
-        # Get the first click, and make sure it isn't a mine
-        if not self.headless:
-            pygame.display.update()
-            pygame.event.clear()
-            while True:
-                event = pygame.event.wait()
-                if event.type == QUIT:
-                    pygame.quit()
-                    sys.exit()
-                elif event.type == MOUSEBUTTONUP:
-                    # Find box that was clicked
-                    m_pos = pygame.mouse.get_pos()
-                    target = [box for box in self.boxes.values() if box.graphics_obj.rect.collidepoint(*m_pos)]
-
-                    if target and event.button == LEFT:
-                        target = target[0]
-                        clicked_box_id = target.get_id()
-                        neighbor_ids = target.get_neighbor_ids(self.neighbor_info)
-
-                        # Pick boxes randomly to have mines, making sure the current one has none
-                        max_tries = int(1e4)
-                        tries = 0
-                        mine_ids = None
-                        while tries < max_tries:
-                            mine_ids = random.sample(range(self.n_rows * self.n_cols), self.n_mines)
-                            if clicked_box_id not in mine_ids:
-                                if not any(neighbor in mine_ids for neighbor in neighbor_ids):
-                                    break
-                            tries += 1
-                        if tries >= max_tries:
-                            raise RuntimeError('Too many iterations attempted. Could not find a valid starting point.')
-
-                        # Set mines
-                        for mine_id in mine_ids:
-                            for box in self.boxes.values():
-                                if box.get_id() == mine_id:
-                                    box.is_mine = True
-
-                        # Exit the loop
-                        break
+    def _save_replay(self):
+        if self.replay_log is not None:
+            self.replay_log.write_grid(self)
+
+    def _start_game(self):
+        # Show the new game, and start its clock if it already started on a pooled no-guess layout
+        flush_display(full=True)
+        pygame.time.set_timer(RESET_EVENT, 0)
+        if self.board.has_mines:
+            self._start_clock()
         else:
-            while True:
-                action, target = self.solver.get_action(self)
-                clicked_box_id = target.get_id()
-                neighbor_ids = target.get_neighbor_ids(self.neighbor_info)
-                # Pick boxes randomly to have mines, making sure the current one has none
-                max_tries = int(1e4)
-                tries = 0
-                mine_ids = None
-                while tries < max_tries:
-                    mine_ids = random.sample(range(self.n_rows * self.n_cols), self.n_mines)
-                    if clicked_box_id not in mine_ids:
-                        if not any(neighbor in mine_ids for neighbor in neighbor_ids):
-                            break
-                    tries += 1
-                if tries >= max_tries:
-                    raise RuntimeError('Too many iterations attempted. Could not find a valid starting point.')
-                # Set mines
-                for mine_id in mine_ids:
-                    for box in self.boxes.values():
-                        if box.get_id() == mine_id:
-                            box.is_mine = True
-                # Exit the loop
-                break
-
-        # Compute each box's number of neighboring mines
-        for box_id, box in self.boxes.items():
-            box.n_neighbors = sum(mine_id in mine_ids for mine_id in box.get_neighbor_ids(self.neighbor_info))
-
-        # Reveal the first one
-        self.reveal(target)
+            pygame.time.set_timer(CLOCK_EVENT, 0)
+            self._update_scoreboard()
+
+    def _start_clock(self):
+        # The clock runs from the first reveal, and ticks once a second from then on
+        self._t0 = time.time()
+        pygame.time.set_timer(CLOCK_EVENT, 1000)
+        self._update_scoreboard()
 
     # def _receive_next_user_move(self):
     #     for event in pygame.event.get():
@@ -491,15 +738,12 @@ class Grid:
         target = None
         action = None
         # Check if the player took an action
-        if event.type == MOUSEBUTTONUP and not self.is_locked:
+        if event.type == pygame.MOUSEBUTTONUP and not self.is_locked:
             # Find box that was selected (if any)
-            m_pos = pygame.mouse.get_pos()
-            target = [box for box in self.boxes.values() if box.graphics_obj.rect.collidepoint(*m_pos)]
+            target = self._pos_to_box(event.pos)
 
             # If a box was clicked, take an action
-            if target:
-                target = target[0]
-                assert isinstance(target, Box)
+            if target is not None:
                 # Left click will reveal the box
                 if event.button == LEFT:
                     action = 0
@@ -510,100 +754,64 @@ class Grid:
         return action, target
 
     def _do_action(self, action: int, target: Box) -> None:
+        if action in (0, 1):
+            self.history.append((action, target.get_id()))
         if action == 0:
             self.reveal(target)
         elif action == 1:
             self.toggle_protect(target)
 
     def run(self, single_game: bool = False) -> None:
-        self._first_move()
-        self._t0 = time.time()
-        if not self.headless:
-            self._update_scoreboard()
-        reset = False
-        reset_t0 = None
-
-        # Main game loop
-        while True:
-            if not self.headless:
-                pygame.display.update()
-            else:
-                raise RuntimeError("Headless mode not implemented.")
-
-            # Check if the game needs to be reset
-            if reset and (time.time() - reset_t0) > RESET_TIME:
+        if self.headless:
+            # Let the solver play through step, with no event loop, frame limiting or reset delay
+            while True:
+                done = False
+                while not done:
+                    action, box_id = self.solver.get_move(self)
+                    _, _, done, _ = self.step(action, box_id)
                 if single_game:
                     return
                 self.reset()
-                pygame.event.clear()
-                reset = False
-                self._first_move()
-                self._t0 = time.time()
-
-            # Check for an input
-            for event in pygame.event.get():
-                if event.type == QUIT:
-                    pygame.quit()
-                    sys.exit()
-                # -> Put this back in the for loop above ->
-                if not reset:
-                    # TODO need to pull headless mode out of event check, and make it so only clicks
-                    #  are accepted (not mouse movement)
-                    if not self.headless:
-                        action, target = self._process_player_action(event)
-                        # action, target = self.solver.get_action(self)
-                    else:
-                        # Receive a target and action.
-                        action, target = self.solver.get_action(self)
-
-                    if target:
-                        # Perform the action
-                        self._do_action(action, target)
-
-                        # After the action is taken, update the scoreboard accordingly
-                        if not self.headless:
-                            self._update_scoreboard()
-
-                        # Check if the game is over
-                        reset = self._check_win()
-                        reset_t0 = time.time()
-                # -> Put this back in the for loop above ->
-
-            if not self.headless:
-                if not self.is_locked:
-                    self._update_scoreboard()
-
-                # Limit the frame rate - tick forward one step
-                FPS.tick(FPS_LIMIT)
 
+        # The loop sleeps until there is something to do: a click, a view key, the clock's tick once a second or the
+        # reset after a game ends. Mouse movement and other events are never queued, so an idle board costs no CPU.
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed([pygame.QUIT, pygame.VIDEOEXPOSE, pygame.MOUSEBUTTONUP, CLOCK_EVENT, RESET_EVENT])
+        if self.viewport:
+            pygame.event.set_allowed([pygame.KEYDOWN, pygame.MOUSEWHEEL])
+        self._start_game()
 
-class Solver:
-    def __init__(self, _solver_type='rl') -> None:
-        self.type = _solver_type
-
-    def get_action(self, grid: Grid) -> (int, Box):
-        # Make random guesses
-        action = random.randint(0, 1)
-        target = None
-        i = 0
-        while i < 100:
-            target = grid._id_to_box(random.randint(0, grid.n_rows * grid.n_cols - 1))
-            if target.is_revealed:
-                i += 1
+        while True:
+            event = pygame.event.wait()
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+            elif event.type == RESET_EVENT:
+                if single_game:
+                    return
+                self.reset()
+                # Clicks made while the finished game was still showing are not meant for the new one
+                pygame.event.clear(pygame.MOUSEBUTTONUP)
+                self._start_game()
+            elif event.type == CLOCK_EVENT:
+                self._update_scoreboard()
+            elif event.type == pygame.VIDEOEXPOSE:
+                flush_display(full=True)
+            elif self.viewport and self._handle_view_event(event):
+                pass
             else:
-                break
-
-        # Use keyboard input
-        # while True:
-        #     str_in = input("Next Move (action, target_id): ")
-        #     action, target = str_in.split(',')
-        #     action = int(action)
-        #     target = grid._id_to_box(int(target.strip()))
-        #     if target.is_revealed:
-        #         print("Target box is already revealed. Pick another box.")
-        #     else:
-        #         break
-        return action, target
+                action, target = self._process_player_action(event)
+                # The first move must be a reveal, which lays the mines around it
+                if target is not None and (self.board.has_mines or action == 0):
+                    if not self.board.has_mines:
+                        self._place_mines(target.get_id())
+                        self._start_clock()
+                    self._do_action(action, target)
+                    self._update_scoreboard()
+                    if self._check_win():
+                        pygame.time.set_timer(CLOCK_EVENT, 0)
+                        pygame.time.set_timer(RESET_EVENT, int(RESET_TIME * 1000), 1)
+            flush_display()
 
 
 difficulties = {'easy':         {'dims': (8, 8),    '_box_size': box_size, 'num_mines': 10},
@@ -618,14 +826,12 @@ if __name__ == "__main__":
     # Run game
     _difficulty = 'debug'
     _headless = False
+    _no_guess = False
     _solver = Solver()
-    grid = Grid(headless=_headless, solver=_solver, **difficulties[_difficulty])
+    grid = Grid(headless=_headless, solver=_solver, no_guess=_no_guess, **difficulties[_difficulty])
     grid.run()
 
 
-# SHORT TERM
-# TODO make "headless" mode
-
 # MEDIUM TERM
 # TODO think about dynamically solving the board as the player progresses to avoid guessing
 
@@ -0,0 +1,180 @@
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+from board import Board, neighbor_table, sample_mines
+from solver import LogicSolver
+
+# No-guess layouts are ones the logic solver wins from their start cell without ever guessing. Making them takes many
+# tries on dense boards, so they are made ahead of time into a pool per board size that games draw from instantly.
+# A pool is an .npy file of int32 (n_boards, 1 + n_mines): each layout's start cell followed by its mine ids.
+POOL_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'minesweeper', 'noguess')
+
+# Repairs in a row before giving up on a layout and drawing a fresh one
+MAX_REPAIRS = 50
+
+
+def solve_logic(board: Board, start_cell: int, solver: LogicSolver) -> bool:
+    # Play a fresh board from start_cell with moves the solver can prove. Returns whether that wins the game; if it
+    # does not, the board is left where the solver got stuck.
+    board.reveal(start_cell)
+    while not board.result():
+        action, cell = solver.get_move(board)
+        if solver.last_move_guessed:
+            return False
+        if action == 0:
+            board.reveal(cell)
+        else:
+            board.toggle_flag(cell)
+    return board.result() > 0
+
+
+def generate(n_rows: int, n_cols: int, n_mines: int, start_cell: int, rng=None, max_attempts: int = 1000):
+    # Sorted mine ids of a layout that can be won from start_cell by logic alone, or None if none turned up in
+    # max_attempts solves. A failed layout is repaired rather than thrown away: one cell beside where the solver got
+    # stuck swaps a mine (or no mine) with a cell the solver never reached, which keeps the part it could solve.
+    rng = np.random.default_rng(rng)
+    nbrs = neighbor_table(n_rows, n_cols)
+    n_cells = n_rows * n_cols
+    solver = LogicSolver(random.Random(0))
+    # The start cell, and its neighbors when there is room, never hold mines (as in sample_mines)
+    keep_clear = np.zeros(n_cells, dtype=bool)
+    keep_clear[start_cell] = True
+    if n_cells - 1 - nbrs[start_cell].size >= n_mines:
+        keep_clear[nbrs[start_cell]] = True
+
+    mines = None
+    n_repairs = 0
+    for _ in range(max_attempts):
+        if mines is None or n_repairs >= MAX_REPAIRS:
+            mines = np.zeros(n_cells, dtype=bool)
+            mines[sample_mines(nbrs, n_mines, start_cell, rng)] = True
+            n_repairs = 0
+        board = Board(n_rows, n_cols, n_mines)
+        board.set_mines(np.flatnonzero(mines))
+        if solve_logic(board, start_cell, solver):
+            return np.flatnonzero(mines)
+
+        # Cells the solver knew nothing about: unrevealed, unflagged and off the frontier
+        stuck = np.array([cell for cell in board.frontier if not board.flagged[cell]], dtype=np.intp)
+        unreached = ~board.revealed & ~board.flagged & ~keep_clear
+        unreached[stuck] = False
+        cell = rng.choice(stuck) if stuck.size else None
+        targets = np.flatnonzero(unreached & (mines != mines[cell])) if cell is not None else ()
+        if not len(targets):
+            mines = None
+            continue
+        target = rng.choice(targets)
+        mines[cell], mines[target] = mines[target], mines[cell]
+        n_repairs += 1
+    return None
+
+
+def pool_path(n_rows: int, n_cols: int, n_mines: int, pool_dir: str = POOL_DIR) -> str:
+    return os.path.join(pool_dir, f'{n_rows}x{n_cols}-{n_mines}.npy')
+
+
+def load_pool(n_rows: int, n_cols: int, n_mines: int, pool_dir: str = POOL_DIR) -> np.ndarray:
+    # The pool for a board size, memory mapped, or an empty array if there is none yet
+    path = pool_path(n_rows, n_cols, n_mines, pool_dir)
+    if not os.path.exists(path):
+        return np.empty((0, 1 + n_mines), dtype=np.int32)
+    return np.load(path, mmap_mode='r')
+
+
+def add_to_pool(layouts, n_rows: int, n_cols: int, n_mines: int, pool_dir: str = POOL_DIR) -> int:
+    # Append (start_cell, mine_ids) layouts to a pool. The file is replaced in one step, so readers never see half of
+    # it. Returns the pool's new size.
+    path = pool_path(n_rows, n_cols, n_mines, pool_dir)
+    rows = np.array([np.append(start_cell, mine_ids) for start_cell, mine_ids in layouts], dtype=np.int32)
+    pool = np.concatenate([load_pool(n_rows, n_cols, n_mines, pool_dir), rows.reshape(-1, 1 + n_mines)])
+    os.makedirs(pool_dir, exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        np.save(f, pool)
+    os.replace(path + '.tmp', path)
+    return len(pool)
+
+
+def draw(n_rows: int, n_cols: int, n_mines: int, rng=None, pool_dir: str = POOL_DIR):
+    # A random (start_cell, mine_ids) from the pool, or None if it is empty. The layout is flipped at random (and
+    # transposed, on square boards), which keeps it solvable and makes every pooled layout good for several games.
+    pool = load_pool(n_rows, n_cols, n_mines, pool_dir)
+    if not len(pool):
+        return None
+    rng = np.random.default_rng(rng)
+    cells = np.array(pool[rng.integers(len(pool))], dtype=np.int64)
+    cols, rows = np.divmod(cells, n_rows)
+    if rng.random() < 0.5:
+        rows = n_rows - 1 - rows
+    if rng.random() < 0.5:
+        cols = n_cols - 1 - cols
+    if n_rows == n_cols and rng.random() < 0.5:
+        rows, cols = cols, rows
+    cells = cols * n_rows + rows
+    return int(cells[0]), np.sort(cells[1:])
+
+
+def _generate(job):
+    # Worker entry point: one layout from a random start cell, or None
+    n_rows, n_cols, n_mines, seed, max_attempts = job
+    rng = np.random.default_rng(seed)
+    start_cell = int(rng.integers(n_rows * n_cols))
+    mine_ids = generate(n_rows, n_cols, n_mines, start_cell, rng, max_attempts)
+    return None if mine_ids is None else (start_cell, mine_ids)
+
+
+def fill_pool(dims, num_mines: int, n_boards: int, seed=None, processes=None, max_attempts: int = 1000,
+              pool_dir: str = POOL_DIR, save_every: int = 100, log=print) -> int:
+    # Generate n_boards layouts across a pool of worker processes and add them to the pool on disk, saving as they
+    # come in so that an interrupted run keeps what it made. Workers are spawned so they never import pygame.
+    # Returns the pool's size.
+    n_rows, n_cols = dims
+    processes = processes or os.cpu_count() or 1
+    seeds = np.random.SeedSequence(seed).spawn(n_boards)
+    jobs = [(n_rows, n_cols, num_mines, s, max_attempts) for s in seeds]
+    new = []
+    n_made = n_failed = 0
+    pool_size = len(load_pool(n_rows, n_cols, num_mines, pool_dir))
+    t0 = time.perf_counter()
+    try:
+        with multiprocessing.get_context('spawn').Pool(processes) as pool:
+            for layout in pool.imap_unordered(_generate, jobs):
+                if layout is None:
+                    n_failed += 1
+                    continue
+                new.append(layout)
+                n_made += 1
+                if len(new) >= save_every:
+                    pool_size = add_to_pool(new, n_rows, n_cols, num_mines, pool_dir)
+                    new.clear()
+                    log(f'{n_made} made ({n_made / (time.perf_counter() - t0):.1f}/s), pool holds {pool_size}')
+    finally:
+        if new:
+            pool_size = add_to_pool(new, n_rows, n_cols, num_mines, pool_dir)
+    log(f'{n_made} made, {n_failed} failed in {time.perf_counter() - t0:.1f}s, pool holds {pool_size}')
+    return pool_size
+
+
+def main(argv=None):
+    from mines import difficulties
+
+    parser = argparse.ArgumentParser(description='Pre-generate no-guess Minesweeper layouts into the on-disk pool.')
+    parser.add_argument('difficulty', choices=sorted(difficulties))
+    parser.add_argument('--boards', type=int, default=1000, help='layouts to add to the pool')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--processes', type=int, default=None, help='worker processes (default: one per core)')
+    parser.add_argument('--max-attempts', type=int, default=1000, help='solves per layout before giving up on it')
+    parser.add_argument('--pool-dir', default=POOL_DIR)
+    args = parser.parse_args(argv)
+    difficulty = difficulties[args.difficulty]
+    fill_pool(difficulty['dims'], difficulty['num_mines'], args.boards, args.seed, args.processes, args.max_attempts,
+              args.pool_dir)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
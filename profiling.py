@@ -0,0 +1,188 @@
+import argparse
+import cProfile
+import json
+import sys
+import time
+from collections import Counter, defaultdict
+
+import batch
+import board
+import mines
+import solver
+
+# Where each phase's time goes. Profiling swaps these functions for timed wrappers while it is on and puts the
+# originals back afterwards, so when it is off the game runs exactly the code it always does (which keeps a running
+# count of blits, mines.n_blits, for the profiler to read). A phase that calls
+# itself (Grid._place_mines calling Board.place_mines, say) is only timed at the outermost call, but different phases
+# nest: place_mines includes its count_neighbors, and render may include reveals' drawing.
+PHASES = (
+    ('place_mines', ((board.Board, 'place_mines'), (board.Board, 'set_mines'), (mines.Grid, '_place_mines'))),
+    ('count_neighbors', ((board, 'count_neighbors'), (batch, 'count_neighbors'))),
+    ('reveal', ((board.Board, 'reveal'), (board.Board, 'reveal_cell'))),
+    ('solver', ((solver.Solver, 'get_board_move'),)),
+    ('step', ((mines.Grid, 'step'),)),
+    ('render', ((mines.Grid, '_draw_cells'), (mines.Grid, '_draw_view'), (mines.Grid, '_update_scoreboard'))),
+    ('display', ((mines, 'flush_display'),)),
+)
+
+_active = None
+
+
+class Profiler:
+    # Per-phase timings and counters for everything run while it is on, e.g.
+    #     with Profiler(cprofile=True) as profiler:
+    #         grid.run(single_game=True)
+    #     profiler.save_json('profile.json'); profiler.dump_stats('profile.pstats')
+    # Only one profiler can be on at a time.
+    def __init__(self, cprofile: bool = False) -> None:
+        self.seconds = defaultdict(float)
+        self.calls = Counter()
+        # cells_revealed, max_cells_revealed (by one reveal), surfaces_blitted, dirty_rects (screen areas pushed to
+        # the display) and display_updates (pushes to the screen, whole-window ones included)
+        self.counters = Counter()
+        self.wall_seconds = 0.0
+        self._cprofile = cProfile.Profile() if cprofile else None
+        self._running = set()
+        self._patched = []
+        self._t0 = None
+        self._n_blits = 0
+
+    def start(self) -> None:
+        global _active
+        if _active is not None:
+            raise RuntimeError('A profiler is already running.')
+        _active = self
+        for phase, targets in PHASES:
+            for owner, name in targets:
+                original = getattr(owner, name)
+                self._patched.append((owner, name, original))
+                setattr(owner, name, self._wrap(phase, original))
+        self._n_blits = mines.n_blits
+        self._t0 = time.perf_counter()
+        if self._cprofile is not None:
+            self._cprofile.enable()
+
+    def stop(self) -> None:
+        global _active
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        self.wall_seconds += time.perf_counter() - self._t0
+        self.counters['surfaces_blitted'] += mines.n_blits - self._n_blits
+        for owner, name, original in reversed(self._patched):
+            setattr(owner, name, original)
+        self._patched.clear()
+        _active = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _wrap(self, phase: str, fn):
+        seconds = self.seconds
+        calls = self.calls
+        counters = self.counters
+        running = self._running
+        perf_counter = time.perf_counter
+
+        if phase == 'reveal':
+            def wrapper(board, *args, **kwargs):
+                n_before = board.n_revealed
+                t0 = perf_counter()
+                try:
+                    return fn(board, *args, **kwargs)
+                finally:
+                    seconds[phase] += perf_counter() - t0
+                    calls[phase] += 1
+                    n_cells = board.n_revealed - n_before
+                    counters['cells_revealed'] += n_cells
+                    if n_cells > counters['max_cells_revealed']:
+                        counters['max_cells_revealed'] = n_cells
+        elif phase == 'display':
+            def wrapper(full=False):
+                if full or mines.dirty_rects:
+                    counters['dirty_rects'] += 0 if full else len(mines.dirty_rects)
+                    counters['display_updates'] += 1
+                t0 = perf_counter()
+                try:
+                    return fn(full)
+                finally:
+                    seconds[phase] += perf_counter() - t0
+                    calls[phase] += 1
+        else:
+            def wrapper(*args, **kwargs):
+                if phase in running:
+                    return fn(*args, **kwargs)
+                running.add(phase)
+                t0 = perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    seconds[phase] += perf_counter() - t0
+                    calls[phase] += 1
+                    running.discard(phase)
+        wrapper.__wrapped__ = fn
+        return wrapper
+
+    def report(self) -> dict:
+        phases = {phase: {'calls': self.calls[phase], 'seconds': self.seconds[phase],
+                          'mean_us': 1e6 * self.seconds[phase] / self.calls[phase]}
+                  for phase, _ in PHASES if self.calls[phase]}
+        counters = dict(self.counters)
+        if self.calls['reveal']:
+            counters['cells_per_reveal'] = self.counters['cells_revealed'] / self.calls['reveal']
+        return {'wall_seconds': self.wall_seconds, 'phases': phases, 'counters': counters}
+
+    def save_json(self, path: str) -> None:
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def dump_stats(self, path: str) -> None:
+        # A pstats file (as cProfile writes), for pstats, snakeviz and the like. Needs cprofile=True.
+        if self._cprofile is None:
+            raise RuntimeError('This profiler was not started with cprofile=True.')
+        self._cprofile.dump_stats(path)
+
+
+def _play(grid, display: bool) -> None:
+    # One game by the grid's solver; drawn like replay.show does, but without pauses, if display is set
+    if not display:
+        grid.run(single_game=True)
+        return
+    mines.flush_display(full=True)
+    done = False
+    while not done:
+        mines.pygame.event.pump()
+        _, _, done, _ = grid.step(*grid.solver.get_move(grid))
+        grid._update_scoreboard()
+        mines.flush_display()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Profile solver games and report where the time goes.')
+    parser.add_argument('difficulty', choices=sorted(mines.difficulties))
+    parser.add_argument('--solver', default='logic', help="solver type: 'logic', 'prob' or 'rl' (random)")
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game; game i uses seed + i')
+    parser.add_argument('--display', action='store_true', help='draw the games, to include rendering')
+    parser.add_argument('--json', help='write the report to this file')
+    parser.add_argument('--pstats', help='also run cProfile and write its stats to this file')
+    args = parser.parse_args(argv)
+
+    difficulty = mines.difficulties[args.difficulty]
+    with Profiler(cprofile=args.pstats is not None) as profiler:
+        for seed in range(args.seed, args.seed + args.games):
+            grid = mines.Grid(difficulty['dims'], difficulty['num_mines'], difficulty['_box_size'],
+                              headless=not args.display, solver=mines.Solver(args.solver, seed=seed), seed=seed)
+            _play(grid, args.display)
+    if args.json:
+        profiler.save_json(args.json)
+    if args.pstats:
+        profiler.dump_stats(args.pstats)
+    print(json.dumps(profiler.report(), indent=2))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+import argparse
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+# A replay log is the magic bytes followed by any number of games, appended one after another so that logs can be
+# written and read as streams. Every number is an unsigned LEB128 varint. A game is:
+#   n_rows, n_cols, n_mines, seed + 1 (0 if unknown), result + 1 (0 lost, 1 unfinished, 2 won), n_moves,
+#   then its n_mines mine ids in increasing order, each as the gap from the one before (the first from 0),
+#   then its n_moves moves, each as zigzag(cell - previous cell) << 1 | action (the first cell is relative to 0).
+# Solvers mostly move to cells near their last one, so a typical move takes a single byte.
+MAGIC = b'MSREPLAY1'
+
+Game = namedtuple('Game', 'n_rows n_cols n_mines seed mines actions cells result')
+
+
+def _encode_varints(values) -> bytes:
+    values = np.asarray(values, dtype=np.uint64)
+    if not values.size:
+        return b''
+    n_bytes = np.ones(values.size, dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        n_bytes += rest > 0
+        rest >>= np.uint64(7)
+    owner = np.repeat(np.arange(values.size), n_bytes)
+    k = np.arange(owner.size) - np.repeat(np.cumsum(n_bytes) - n_bytes, n_bytes)
+    out = ((values[owner] >> (7 * k).astype(np.uint64)) & np.uint64(0x7f)).astype(np.uint8)
+    out[k < n_bytes[owner] - 1] |= 0x80
+    return out.tobytes()
+
+
+def _decode_varints(buf: np.ndarray, pos: int, count: int) -> (np.ndarray, int):
+    # Decode count varints from buf (uint8) starting at pos. Returns them and the position after the last one.
+    if not count:
+        return np.empty(0, dtype=np.uint64), pos
+    chunk = buf[pos:pos + 10 * count]
+    ends = np.flatnonzero(chunk < 0x80)[:count]
+    if ends.size < count:
+        raise ValueError('Replay log is truncated.')
+    n_used = int(ends[-1]) + 1
+    chunk = chunk[:n_used]
+    starts = np.empty(count, dtype=np.int64)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    k = np.arange(n_used) - np.repeat(starts, ends - starts + 1)
+    parts = (chunk & 0x7f).astype(np.uint64) << (7 * k).astype(np.uint64)
+    return np.bitwise_or.reduceat(parts, starts), pos + n_used
+
+
+def _zigzag(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def _unzigzag(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.int64)
+    return (values >> 1) ^ -(values & 1)
+
+
+def encode_game(n_rows: int, n_cols: int, seed, mines, moves, result: int) -> bytes:
+    # mines: ids of the mine cells. moves: sequence of (action, cell). result: 1 won, -1 lost, 0 unfinished.
+    mines = np.sort(np.asarray(mines, dtype=np.int64))
+    moves = np.asarray(moves, dtype=np.int64).reshape(-1, 2)
+    if ((moves[:, 0] != 0) & (moves[:, 0] != 1)).any():
+        raise ValueError('Only reveals (0) and flags (1) can be recorded.')
+    header = [n_rows, n_cols, mines.size, 0 if seed is None else seed + 1, result + 1, len(moves)]
+    cells = moves[:, 1]
+    move_codes = (_zigzag(np.diff(cells, prepend=0)) << np.uint64(1)) | moves[:, 0].astype(np.uint64)
+    return _encode_varints(header) + _encode_varints(np.diff(mines, prepend=0)) + _encode_varints(move_codes)
+
+
+class ReplayWriter:
+    # Appends games to a replay log, creating it (with its magic bytes) if it does not exist yet
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.n_games = 0
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+
+    def write(self, n_rows: int, n_cols: int, seed, mines, moves, result: int) -> None:
+        self._file.write(encode_game(n_rows, n_cols, seed, mines, moves, result))
+        self.n_games += 1
+
+    def write_grid(self, grid) -> None:
+        self.write(grid.n_rows, grid.n_cols, grid.seed, np.flatnonzero(grid.board.mines), grid.history,
+                   grid._game_result())
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_games(path: str):
+    # Yield every Game in a replay log, in order. The log is memory mapped, so only the part being read is loaded.
+    buf = np.memmap(path, dtype=np.uint8, mode='r')
+    if bytes(buf[:len(MAGIC)]) != MAGIC:
+        raise ValueError(f'{path} is not a replay log.')
+    pos = len(MAGIC)
+    while pos < buf.size:
+        header, pos = _decode_varints(buf, pos, 6)
+        n_rows, n_cols, n_mines, seed, result, n_moves = header.tolist()
+        gaps, pos = _decode_varints(buf, pos, n_mines)
+        codes, pos = _decode_varints(buf, pos, n_moves)
+        actions = (codes & np.uint64(1)).astype(np.int8)
+        cells = np.cumsum(_unzigzag(codes >> np.uint64(1)))
+        yield Game(n_rows, n_cols, n_mines, seed - 1 if seed else None, np.cumsum(gaps.astype(np.int64)), actions,
+                   cells, result - 1)
+
+
+def _load(game: Game, headless=True, **grid_kwargs):
+    # A Grid set up with the recorded mine layout. Headless grids never import pygame.
+    from mines import Grid
+
+    grid = Grid((game.n_rows, game.n_cols), game.n_mines, headless=headless, **grid_kwargs)
+    grid.board.set_mines(game.mines)
+    return grid
+
+
+def replay(game: Game) -> int:
+    # Re-run a game's moves headless, as fast as Grid.step allows. Returns the result reached, which matches
+    # game.result for a faithful log.
+    grid = _load(game)
+    result = 0
+    for action, cell in zip(game.actions.tolist(), game.cells.tolist()):
+        _, result, done, _ = grid.step(action, cell)
+        if done:
+            break
+    return result
+
+
+def show(game: Game, delay: float = 0.05, **grid_kwargs) -> int:
+    # Re-run a game on screen, one move every delay seconds. Returns the result reached.
+    import mines
+
+    grid = _load(game, headless=False, **grid_kwargs)
+    mines.flush_display(full=True)
+    result = 0
+    for action, cell in zip(game.actions.tolist(), game.cells.tolist()):
+        for event in mines.pygame.event.get():
+            if event.type == mines.pygame.QUIT:
+                return result
+            if grid.viewport:
+                grid._handle_view_event(event)
+        _, result, done, _ = grid.step(action, cell)
+        grid._update_scoreboard()
+        mines.flush_display()
+        time.sleep(delay)
+        if done:
+            break
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay recorded Minesweeper games.')
+    parser.add_argument('path')
+    parser.add_argument('--show', action='store_true', help='draw the games instead of checking them headless')
+    parser.add_argument('--delay', type=float, default=0.05, help='seconds between moves when shown')
+    parser.add_argument('--limit', type=int, default=None, help='replay at most this many games')
+    args = parser.parse_args(argv)
+
+    n_games = n_moves = n_mismatched = 0
+    t0 = time.perf_counter()
+    for game in read_games(args.path):
+        if args.limit is not None and n_games >= args.limit:
+            break
+        result = show(game, args.delay) if args.show else replay(game)
+        n_games += 1
+        n_moves += game.actions.size
+        n_mismatched += result != game.result
+    elapsed = time.perf_counter() - t0
+    print(f'{n_games} games, {n_moves} moves in {elapsed:.2f}s ({n_games / max(elapsed, 1e-9):.0f} games/s), '
+          f'{n_mismatched} ended differently than recorded')
+    return int(n_mismatched > 0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,277 @@
+import argparse
+import asyncio
+import json
+import secrets
+import socket
+import sys
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from board import Board
+
+# Games over TCP, one JSON object per line each way, for remote solver agents and front ends. Every request gets one
+# response, in order; a request's "id", if any, is echoed back. Commands:
+#   {"cmd": "new", "difficulty": "expert"} or {"cmd": "new", "rows": 16, "cols": 30, "mines": 99}, optionally "seed"
+#       -> {"session", "rows", "cols", "mines"}
+#   {"cmd": "reveal", "session", "cell": id} or "cells": [id, ...] to make several moves at once
+#   {"cmd": "flag", "session", "cell" or "cells"}
+#       -> the change: {"cells": ids revealed, "values": what they show, "flagged": ids left flagged, "unflagged": ids
+#          left unflagged, "version", "result", "done"}. Cell ids run down columns: id = col * rows + row.
+#   {"cmd": "state", "session"} -> the whole board: {"visible": n_cells values, "version", "result", "done"}, with
+#       values as in board.visible. With "since": version, only the cells revealed after that version, as for reveal,
+#       plus every flagged cell.
+#   {"cmd": "close", "session"} -> {"closed": true}
+# Errors come back as {"error": message}. Sessions belong to no connection, so an agent can reconnect to its games.
+# A request line may be up to MAX_REQUEST_BYTES long, enough to list every cell of the largest board; a longer one is
+# skipped and answered with an error.
+# Sessions idle for longer than the idle timeout are dropped, as is the least recently used once there are too many.
+
+# Board sizes the server will host, to bound memory per session
+MAX_CELLS = 250000
+
+# Longest request line read: room for all MAX_CELLS ids (at most 6 digits and a ", " each) and the rest of a request
+MAX_REQUEST_BYTES = 16 * MAX_CELLS
+_TOO_LONG = object()
+
+
+def _integer(request: dict, field: str) -> int:
+    # A field that must be a JSON integer
+    value = request[field]
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ValueError(f'{field} must be an integer.')
+    return value
+
+
+class Session:
+    __slots__ = ('board', 'rng', 'last_used')
+
+    def __init__(self, n_rows: int, n_cols: int, n_mines: int, seed=None) -> None:
+        self.board = Board(n_rows, n_cols, n_mines)
+        self.rng = np.random.default_rng(seed)
+        self.last_used = time.monotonic()
+
+    def reveal(self, cells) -> list:
+        # Moves as in Grid.step: the first reveal lays the mines, and nothing changes once the game is over
+        board = self.board
+        revealed = []
+        for cell in cells:
+            if board.result():
+                break
+            if not board.has_mines:
+                board.place_mines(cell, self.rng)
+            revealed.append(board.reveal(cell))
+        return revealed
+
+    def flag(self, cells) -> (list, list):
+        # Toggle each cell in turn. Returns the cells touched, split by the flag state they were left in, so a cell
+        # toggled twice in one request is reported once.
+        board = self.board
+        touched = {}
+        for cell in cells:
+            if board.result():
+                break
+            if not board.revealed[cell]:
+                touched[cell] = board.toggle_flag(cell)
+        return ([cell for cell, flagged in touched.items() if flagged],
+                [cell for cell, flagged in touched.items() if not flagged])
+
+    def status(self) -> dict:
+        result = self.board.result()
+        return {'version': len(self.board.reveal_log), 'result': result, 'done': result != 0}
+
+    def diff(self, revealed: list, flagged=(), unflagged=()) -> dict:
+        cells = np.concatenate(revealed) if revealed else np.empty(0, dtype=np.intp)
+        return dict({'cells': cells.tolist(), 'values': self.board.visible[cells].tolist(), 'flagged': list(flagged),
+                     'unflagged': list(unflagged)}, **self.status())
+
+
+class GameServer:
+    def __init__(self, max_sessions: int = 10000, idle_timeout: float = 600.0, difficulties=None) -> None:
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.difficulties = difficulties or {}
+        # Least recently used first
+        self.sessions = OrderedDict()
+        self.n_evicted = 0
+
+    def handle(self, request: dict) -> dict:
+        # Answer one request. Raises ValueError, or KeyError for a missing field, for bad ones.
+        if not isinstance(request, dict):
+            raise ValueError('A request must be a JSON object.')
+        cmd = request.get('cmd')
+        if cmd == 'new':
+            return self._new(request)
+        session_id = request.get('session')
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise ValueError(f'No session {session_id!r}; it may have been closed for being idle.')
+        session.last_used = time.monotonic()
+        self.sessions.move_to_end(session_id)
+
+        if cmd in ('reveal', 'flag'):
+            cells = self._cells(request, session.board)
+            if cmd == 'reveal':
+                return session.diff(session.reveal(cells))
+            return session.diff([], *session.flag(cells))
+        elif cmd == 'state':
+            if 'since' in request:
+                since = _integer(request, 'since')
+                if since < 0:
+                    raise ValueError('Version since must not be negative.')
+                board = session.board
+                state = session.diff(board.reveal_log[since:])
+                state['flagged'] = np.flatnonzero(board.flagged).tolist()
+                return state
+            return dict({'visible': session.board.visible.tolist()}, **session.status())
+        elif cmd == 'close':
+            del self.sessions[session_id]
+            return {'closed': True}
+        raise ValueError(f'Unknown command {cmd!r}.')
+
+    def _new(self, request: dict) -> dict:
+        if 'difficulty' in request:
+            difficulty = self.difficulties.get(request['difficulty'])
+            if difficulty is None:
+                raise ValueError(f"Unknown difficulty {request['difficulty']!r}.")
+            (n_rows, n_cols), n_mines = difficulty['dims'], difficulty['num_mines']
+        else:
+            n_rows, n_cols, n_mines = _integer(request, 'rows'), _integer(request, 'cols'), _integer(request, 'mines')
+        if not (0 < n_rows * n_cols <= MAX_CELLS and n_rows > 0 and 0 <= n_mines < n_rows * n_cols):
+            raise ValueError(f'Unsupported board: {n_rows}x{n_cols} with {n_mines} mines.')
+        seed = _integer(request, 'seed') if request.get('seed') is not None else None
+        if seed is not None and seed < 0:
+            raise ValueError('seed must not be negative.')
+        session = Session(n_rows, n_cols, n_mines, seed)
+        while len(self.sessions) >= self.max_sessions:
+            self.sessions.popitem(last=False)
+            self.n_evicted += 1
+        session_id = secrets.token_hex(8)
+        self.sessions[session_id] = session
+        return {'session': session_id, 'rows': n_rows, 'cols': n_cols, 'mines': n_mines}
+
+    @staticmethod
+    def _cells(request: dict, board: Board) -> list:
+        cells = [request['cell']] if 'cell' in request else request['cells']
+        if not isinstance(cells, list) or any(not isinstance(cell, int) or isinstance(cell, bool) for cell in cells):
+            raise ValueError('Cells must be integer ids.')
+        if any(not 0 <= cell < board.n_cells for cell in cells):
+            raise ValueError('Cell id out of range.')
+        return cells
+
+    def evict_idle(self) -> int:
+        # Drop sessions idle for longer than the timeout. The least recently used come first, so this stops at the
+        # first one still in use.
+        cutoff = time.monotonic() - self.idle_timeout
+        n = 0
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            if session.last_used > cutoff:
+                break
+            del self.sessions[session_id]
+            n += 1
+        self.n_evicted += n
+        return n
+
+    @staticmethod
+    async def _read_line(reader: asyncio.StreamReader):
+        # The next line, b'' at the end of the stream, or _TOO_LONG for a line over the reader's limit, which is read
+        # and thrown away so that the next request starts where it should
+        try:
+            return await reader.readuntil(b'\n')
+        except asyncio.IncompleteReadError as e:
+            return e.partial
+        except asyncio.LimitOverrunError as e:
+            n_skip = e.consumed
+        while True:
+            await reader.readexactly(n_skip)
+            try:
+                await reader.readuntil(b'\n')
+                return _TOO_LONG
+            except asyncio.LimitOverrunError as e:
+                n_skip = e.consumed
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await self._read_line(reader)
+                if not line:
+                    break
+                try:
+                    if line is _TOO_LONG:
+                        raise ValueError(f'Request longer than {MAX_REQUEST_BYTES} bytes.')
+                    request = json.loads(line)
+                    response = self.handle(request)
+                    if 'id' in request:
+                        response['id'] = request['id']
+                except Exception as e:
+                    # Whatever a request raises is that request's error; the connection and server carry on
+                    response = {'error': str(e) if not isinstance(e, KeyError) else f'Missing field {e}.'}
+                writer.write(json.dumps(response, separators=(',', ':')).encode() + b'\n')
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _evict_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(max(self.idle_timeout / 10, 1.0))
+            self.evict_idle()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8765, ready=None) -> None:
+        # Serve until cancelled. ready, if given, is called with the listening socket's (host, port).
+        server = await asyncio.start_server(self._serve_client, host, port, limit=MAX_REQUEST_BYTES)
+        evictor = asyncio.ensure_future(self._evict_periodically())
+        if ready is not None:
+            ready(server.sockets[0].getsockname()[:2])
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            evictor.cancel()
+
+
+class Client:
+    # A blocking client, for solver agents and testing, e.g.
+    #     client = Client('127.0.0.1', 8765)
+    #     game = client.request(cmd='new', difficulty='expert')
+    #     change = client.request(cmd='reveal', session=game['session'], cell=200)
+    def __init__(self, host: str = '127.0.0.1', port: int = 8765) -> None:
+        self._sock = socket.create_connection((host, port))
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._sock.makefile('rwb')
+
+    def request(self, **request) -> dict:
+        # Send a request and return its response. Raises ValueError if the server answers with an error.
+        self._file.write(json.dumps(request).encode() + b'\n')
+        self._file.flush()
+        response = json.loads(self._file.readline())
+        if 'error' in response:
+            raise ValueError(response['error'])
+        return response
+
+    def close(self) -> None:
+        self._file.close()
+        self._sock.close()
+
+
+def main(argv=None):
+    from mines import difficulties
+
+    parser = argparse.ArgumentParser(description='Host headless Minesweeper games over TCP (JSON lines).')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--max-sessions', type=int, default=10000)
+    parser.add_argument('--idle-timeout', type=float, default=600.0, help='seconds before an idle session is dropped')
+    args = parser.parse_args(argv)
+    server = GameServer(args.max_sessions, args.idle_timeout, difficulties)
+    try:
+        asyncio.run(server.serve(args.host, args.port, lambda address: print('Serving on {}:{}'.format(*address))))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    sys.exit(main())
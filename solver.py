@@ -0,0 +1,749 @@
+import random
+from collections import OrderedDict
+from functools import lru_cache
+from math import comb
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from mines import Box
+
+# Local patterns are read from the 5x5 window around a constraint, whose inner 3x3 numbers have neighborhoods wholly
+# inside it. Positions in a window run row by row, 0-24; _INNER are the 3x3 around the centre and _ADJACENT[i] marks
+# the neighbors of _INNER[i]. A solver codes each cell as its number once revealed, or as one of these. Cells off the
+# board read as a revealed 0, since neither can hold a mine or constrain anything.
+_UNKNOWN = -1
+_KNOWN_MINE = -2
+_WINDOW_OFFSETS = [(dr, dc) for dr in range(-2, 3) for dc in range(-2, 3)]
+_INNER = [p for p, (dr, dc) in enumerate(_WINDOW_OFFSETS) if abs(dr) < 2 and abs(dc) < 2]
+_ADJACENT = np.zeros((len(_INNER), len(_WINDOW_OFFSETS)), dtype=np.int8)
+for _i, _p in enumerate(_INNER):
+    _ADJACENT[_i, [_p - 6, _p - 5, _p - 4, _p - 1, _p + 1, _p + 4, _p + 5, _p + 6]] = 1
+
+
+@lru_cache(maxsize=16)
+def _windows(n_rows: int, n_cols: int) -> np.ndarray:
+    # For every cell, the ids of the 5x5 window centred on it, with n_cells for cells off the board
+    n_cells = n_rows * n_cols
+    cells = np.arange(n_cells)
+    rows = cells % n_rows
+    cols = cells // n_rows
+    windows = np.empty((n_cells, len(_WINDOW_OFFSETS)), dtype=np.intp)
+    for p, (dr, dc) in enumerate(_WINDOW_OFFSETS):
+        r = rows + dr
+        c = cols + dc
+        windows[:, p] = np.where((r >= 0) & (r < n_rows) & (c >= 0) & (c < n_cols), c * n_rows + r, n_cells)
+    windows.flags.writeable = False
+    return windows
+
+
+def _pattern_keys(windows: np.ndarray) -> np.ndarray:
+    # Canonical keys of a stack of windows (n, 25) of codes: for each inner number with unknown neighbors, the mines
+    # still to place around it (-1 for the rest), then a bit mask of the unknown cells next to those numbers. Windows
+    # alike in everything that bears on the deduction share a key, whatever else is around them. Returns (n, 13)
+    # uint8, with all-0xff for the first 9 bytes when there is nothing to deduce.
+    unknown = (windows == _UNKNOWN).astype(np.int8)
+    numbers = windows[:, _INNER]
+    remaining = numbers - (windows == _KNOWN_MINE).astype(np.int8) @ _ADJACENT.T
+    active = (unknown @ _ADJACENT.T > 0) & (numbers > 0) & (numbers <= 8)
+    variables = unknown & (active.astype(np.int8) @ _ADJACENT > 0)
+    return np.concatenate([np.where(active, remaining, -1).astype(np.int8).view(np.uint8),
+                           np.packbits(variables, axis=1)], axis=1)
+
+
+def _solve_pattern(key: bytes) -> (tuple, tuple):
+    # Window positions that are safe, and that are mines, in every assignment of mines to the key's unknown cells
+    # that satisfies its numbers. The numbers' neighborhoods lie wholly inside the window, so what holds here holds
+    # on the whole board.
+    remaining = np.frombuffer(key[:len(_INNER)], dtype=np.int8).tolist()
+    variables = np.flatnonzero(np.unpackbits(np.frombuffer(key[len(_INNER):], dtype=np.uint8))).tolist()
+    index = {q: i for i, q in enumerate(variables)}
+    constraints = [([index[q] for q in np.flatnonzero(_ADJACENT[i]).tolist() if q in index], n_mines)
+                   for i, n_mines in enumerate(remaining) if n_mines >= 0]
+
+    # Per constraint: mines still to place, and cells still unassigned; per variable: the constraints it is in
+    need = [n_mines for _, n_mines in constraints]
+    left = [len(cells) for cells, _ in constraints]
+    member = [[] for _ in variables]
+    for k, (cells, _) in enumerate(constraints):
+        for i in cells:
+            member[i].append(k)
+    seen = [0] * len(variables)   # bit 1: safe in some solution, bit 2: a mine in some solution
+    assignment = [0] * len(variables)
+
+    def search(i: int) -> None:
+        if i == len(variables):
+            for j, value in enumerate(assignment):
+                seen[j] |= 2 if value else 1
+            return
+        for value in (0, 1):
+            ok = True
+            for k in member[i]:
+                need[k] -= value
+                left[k] -= 1
+                if need[k] < 0 or need[k] > left[k]:
+                    ok = False
+            if ok:
+                assignment[i] = value
+                search(i + 1)
+            for k in member[i]:
+                need[k] += value
+                left[k] += 1
+
+    search(0)
+    return (tuple(q for q, s in zip(variables, seen) if s == 1),
+            tuple(q for q, s in zip(variables, seen) if s == 2))
+
+
+class PatternCache:
+    # Conclusions about the 5x5 windows seen around constraints, in a bounded LRU shared by every solver in the
+    # process. Most deductions beyond the single-cell rule come from a few small recurring shapes (1-2-1, 1-1 at a
+    # wall, corners), so after a few games most windows are a dictionary lookup rather than a search. A solver uses it
+    # once given it as its patterns.
+    def __init__(self, max_size: int = 65536) -> None:
+        self.max_size = max_size
+        self._table = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.n_resolved = 0   # lookups that proved at least one cell
+
+    def lookup(self, key: bytes) -> (tuple, tuple):
+        result = self._table.get(key)
+        if result is None:
+            self.misses += 1
+            result = self._table[key] = _solve_pattern(key)
+            if len(self._table) > self.max_size:
+                self._table.popitem(last=False)
+        else:
+            self.hits += 1
+            self._table.move_to_end(key)
+        if result[0] or result[1]:
+            self.n_resolved += 1
+        return result
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {'lookups': lookups, 'hits': self.hits, 'hit_rate': self.hits / lookups if lookups else 0.0,
+                'resolved': self.n_resolved, 'size': len(self._table)}
+
+    def clear(self) -> None:
+        self._table.clear()
+        self.hits = self.misses = self.n_resolved = 0
+
+
+PATTERNS = PatternCache()
+
+
+class LogicSolver:
+    # Deterministic constraint propagation over the revealed numbers of a Board. Every revealed, numbered cell with
+    # unknown neighbors is a constraint: its unknown neighbors hold exactly (number - known mines around it) mines.
+    # Constraints are only re-examined when one of their cells changes, and the state is kept between moves and only
+    # rebuilt when a new board is seen. It guesses only when no move is certain.
+    # Table of local patterns to consult before the pairwise rule, e.g. PATTERNS; off by default. It wins more games
+    # (34.3% rather than 32.7% on expert) but makes each move ~10% slower, even with the table warm.
+    patterns = None
+
+    def __init__(self, rng: random.Random) -> None:
+        self.rng = rng
+        self._board = None
+        self.n_guesses = 0
+        self.last_move_guessed = False
+
+    def _new_board(self, board) -> None:
+        self._board = board
+        self._log = board.reveal_log
+        self._log_pos = 0
+        self._mines = set()       # cells known to be mines
+        self._safe = []           # cells known to be safe, waiting to be revealed
+        self._to_flag = []        # known mines not yet flagged
+        self._dirty = set()       # constraints to re-check with the single-cell rule
+        self._pair_dirty = set()  # constraints to re-check against their neighbors with the pairwise rule
+        self._pattern_dirty = set()  # constraints whose pattern window to look up
+        self._nbrs = board.nbrs.padded
+        self._windows = _windows(board.n_rows, board.n_cols)
+        # What the solver knows of each cell as pattern window codes, plus a final 0 for cells off the board
+        self._codes = np.full(board.n_cells + 1, _UNKNOWN, dtype=np.int8)
+        self._codes[-1] = 0
+
+    def get_move(self, board) -> (int, int):
+        # A restored board has a new reveal log, and needs starting over just like a new board
+        if board is not self._board or board.reveal_log is not self._log:
+            self._new_board(board)
+        self._sync()
+        self.last_move_guessed = False
+
+        while True:
+            cell = self._next_safe()
+            if cell is not None:
+                return 0, cell
+            if not self._deduce():
+                break
+        while self._to_flag:
+            cell = self._to_flag.pop()
+            if not board.flagged[cell] and not board.revealed[cell]:
+                return 1, cell
+
+        self.last_move_guessed = True
+        self.n_guesses += 1
+        return 0, self._guess()
+
+    def _sync(self) -> None:
+        # Catch up on cells revealed since the last move; their revealed, numbered neighbors have changed
+        board = self._board
+        log = board.reveal_log
+        counts = board.counts
+        revealed = board.revealed
+        codes = self._codes
+        while self._log_pos < len(log):
+            cells = log[self._log_pos]
+            codes[cells] = counts[cells]
+            for cell in cells.tolist():
+                if counts[cell] > 0:
+                    self._touch(cell)
+                for neighbor in self._nbrs[cell].tolist():
+                    if revealed[neighbor] and counts[neighbor] > 0:
+                        self._touch(neighbor)
+            self._log_pos += 1
+
+    def _touch(self, cell: int) -> None:
+        self._dirty.add(cell)
+        self._pair_dirty.add(cell)
+        self._pattern_dirty.add(cell)
+
+    def _constraint(self, cell: int) -> (set, int):
+        # The unknown neighbors of a revealed cell, and how many mines remain among them
+        revealed = self._board.revealed
+        unknown = set()
+        n_mines = 0
+        for neighbor in self._nbrs[cell].tolist():
+            if neighbor == cell or revealed[neighbor]:
+                continue
+            if neighbor in self._mines:
+                n_mines += 1
+            else:
+                unknown.add(neighbor)
+        return unknown, int(self._board.counts[cell]) - n_mines
+
+    def _mark_safe(self, cells) -> None:
+        self._safe.extend(cells)
+
+    def _mark_mines(self, cells) -> None:
+        revealed = self._board.revealed
+        for cell in cells:
+            if cell not in self._mines:
+                self._mines.add(cell)
+                self._to_flag.append(cell)
+                self._codes[cell] = _KNOWN_MINE
+                for neighbor in self._nbrs[cell].tolist():
+                    if revealed[neighbor]:
+                        self._touch(neighbor)
+
+    def _next_safe(self):
+        board = self._board
+        while self._safe:
+            cell = self._safe.pop()
+            if not board.revealed[cell] and not board.flagged[cell]:
+                return cell
+        return None
+
+    def _deduce(self) -> bool:
+        # Apply the single-cell rule to every changed constraint, then the pattern table, the pairwise rule and the
+        # mine total. Returns whether anything new was learned.
+        found = False
+        while self._dirty:
+            unknown, n_mines = self._constraint(self._dirty.pop())
+            if not unknown:
+                continue
+            if n_mines == 0:
+                self._mark_safe(unknown)
+                found = True
+            elif n_mines == len(unknown):
+                self._mark_mines(unknown)
+                found = True
+        if found:
+            return True
+        return self._deduce_patterns() or self._deduce_pairs() or self._deduce_global()
+
+    def _deduce_patterns(self) -> bool:
+        # Look up the windows around every changed constraint in the pattern table, each distinct key once, and apply
+        # everything they prove. Their keys are made all at once. Windows are only looked up again once they change.
+        changed = self._pattern_dirty
+        self._pattern_dirty = set()
+        if self.patterns is None or not changed:
+            return False
+        cells = np.fromiter(changed, dtype=np.intp, count=len(changed))
+        windows = self._windows[cells]
+        keys = _pattern_keys(self._codes[windows])
+        useful = np.flatnonzero((keys[:, :len(_INNER)] != 0xff).any(axis=1))
+        if not useful.size:
+            return False
+        distinct, which = np.unique(keys[useful], axis=0, return_inverse=True)
+        results = [self.patterns.lookup(key.tobytes()) for key in distinct]
+        found = False
+        for i, k in zip(useful.tolist(), which.ravel().tolist()):
+            safe, mines = results[k]
+            if safe or mines:
+                window = windows[i].tolist()
+                self._mark_safe([window[p] for p in safe])
+                self._mark_mines([window[p] for p in mines])
+                found = True
+        return found
+
+    def _deduce_pairs(self) -> bool:
+        # For constraints A and B: if B's mines outside A must fill every cell there (rB - rA == |B - A|), then those
+        # cells are mines and A's cells outside B are safe. With B - A non-empty and A inside B, rB == rA instead
+        # makes B - A safe.
+        revealed = self._board.revealed
+        counts = self._board.counts
+        changed = self._pair_dirty
+        self._pair_dirty = set()
+        found = False
+        for a in changed:
+            unknown_a, mines_a = self._constraint(a)
+            if not unknown_a:
+                continue
+            partners = set()
+            for cell in unknown_a:
+                for neighbor in self._nbrs[cell].tolist():
+                    if neighbor != a and revealed[neighbor] and counts[neighbor] > 0:
+                        partners.add(neighbor)
+            for b in partners:
+                unknown_b, mines_b = self._constraint(b)
+                for (u1, m1), (u2, m2) in (((unknown_a, mines_a), (unknown_b, mines_b)),
+                                           ((unknown_b, mines_b), (unknown_a, mines_a))):
+                    only_1 = u1 - u2
+                    only_2 = u2 - u1
+                    if not only_2:
+                        continue
+                    if m2 - m1 == len(only_2):
+                        self._mark_mines(only_2)
+                        self._mark_safe(only_1)
+                        found = True
+                    elif not only_1 and m2 == m1:
+                        self._mark_safe(only_2)
+                        found = True
+            if found:
+                # Anything not yet examined stays queued for the next pass
+                self._pair_dirty |= changed
+                return True
+        return False
+
+    def _deduce_global(self) -> bool:
+        # Once the unknown cells are few enough, the total mine count decides them: all mines or all safe
+        board = self._board
+        if not board.has_mines:
+            return False
+        n_unknown = board.n_cells - board.n_revealed - len(self._mines)
+        n_mines = board.n_mines - len(self._mines)
+        if not n_unknown or n_mines not in (0, n_unknown):
+            return False
+        unknown = [cell for cell in np.flatnonzero(~board.revealed).tolist() if cell not in self._mines]
+        if n_mines == 0:
+            self._mark_safe(unknown)
+        else:
+            self._mark_mines(unknown)
+        return True
+
+    def _guess(self) -> int:
+        board = self._board
+        candidates = np.flatnonzero(~(board.revealed | board.flagged)).tolist()
+        candidates = [cell for cell in candidates if cell not in self._mines] or candidates
+        return self.rng.choice(candidates)
+
+
+def _convolve(a: list, b: list) -> list:
+    # Product of two polynomials in the number of mines, as lists of (exact, integer) coefficients
+    out = [0] * (len(a) + len(b) - 1)
+    for i, x in enumerate(a):
+        if x:
+            for j, y in enumerate(b):
+                out[i + j] += x * y
+    return out
+
+
+def _add_into(acc: dict, key, poly: list, shift: int = 0) -> None:
+    current = acc.get(key)
+    if current is None:
+        current = acc[key] = [0] * (len(poly) + shift)
+    elif len(current) < len(poly) + shift:
+        current.extend([0] * (len(poly) + shift - len(current)))
+    for i, x in enumerate(poly):
+        current[i + shift] += x
+
+
+class ProbabilitySolver(LogicSolver):
+    # Logic solver that, instead of guessing blindly, guesses the cell least likely to be a mine. The frontier (unknown
+    # cells next to a revealed number) is split into components that share no constraints; the solutions of each are
+    # counted by number of mines, then combined with the unconstrained interior by weighting each total by the number
+    # of ways to place the remaining mines there. Component results are cached by their constraints, so components a
+    # move did not touch cost nothing to re-use. Components too wide to count exactly are estimated by sampling.
+    max_states = 4096      # widest exact count, in distinct constraint states at one cell
+    n_samples = 200        # solutions drawn to estimate a component that is too wide
+    max_sample_nodes = 50000  # search steps for all of a component's samples
+    max_cache = 1024
+
+    def __init__(self, rng: random.Random) -> None:
+        super().__init__(rng)
+        self.probabilities = {}
+        self.interior_probability = 0.0
+        self.n_sampled = 0
+
+    def _new_board(self, board) -> None:
+        super()._new_board(board)
+        self._cache = {}
+
+    def get_move(self, board) -> (int, int):
+        action, cell = super().get_move(board)
+        if self.last_move_guessed:
+            # The exact counts may have proved some cell safe after all, in which case take that instead
+            next_safe = self._next_safe()
+            if next_safe is not None:
+                self.n_guesses -= 1
+                self.last_move_guessed = False
+                return 0, next_safe
+        return action, cell
+
+    def mine_probabilities(self, board) -> np.ndarray:
+        # Chance of a mine under each cell of the board as it stands (0 for revealed cells), without making a move
+        if board is not self._board or board.reveal_log is not self._log:
+            self._new_board(board)
+        probabilities = np.zeros(board.n_cells, dtype=np.float32)
+        if not board.has_mines:
+            probabilities[~board.revealed] = board.n_mines / board.n_cells
+            return probabilities
+        frontier, interior_p, n_interior = self._cell_probabilities()
+        if n_interior:
+            probabilities[~board.revealed] = interior_p
+        probabilities[list(frontier)] = list(frontier.values())
+        probabilities[list(self._mines)] = 1
+        return probabilities
+
+    def _guess(self) -> int:
+        board = self._board
+        if not board.has_mines:
+            return super()._guess()
+        self.probabilities, self.interior_probability, n_interior = self._cell_probabilities()
+        candidates = [(p, cell) for cell, p in self.probabilities.items() if not board.flagged[cell]]
+        best = min([p for p, _ in candidates] + ([self.interior_probability] if n_interior else []), default=None)
+        if best is None:
+            return super()._guess()
+        # Pick uniformly among every cell, frontier or interior, that is least likely to be a mine
+        best_cells = [cell for p, cell in candidates if p == best]
+        n_best_interior = n_interior if n_interior and self.interior_probability == best else 0
+        if self.rng.randrange(len(best_cells) + n_best_interior) < len(best_cells):
+            return self.rng.choice(best_cells)
+        return self._interior_cell()
+
+    def _interior_cell(self) -> int:
+        # A random unflagged cell that is neither revealed, on the frontier nor known to be a mine. Tries a few cells
+        # at random before falling back to a scan of the board, which is only needed once the interior is small.
+        board = self._board
+        for _ in range(64):
+            cell = self.rng.randrange(board.n_cells)
+            if (not board.revealed[cell] and not board.flagged[cell] and cell not in board.frontier
+                    and cell not in self._mines):
+                return cell
+        cells = [cell for cell in np.flatnonzero(~(board.revealed | board.flagged)).tolist()
+                 if cell not in board.frontier and cell not in self._mines]
+        return self.rng.choice(cells) if cells else super()._guess()
+
+    def _cell_probabilities(self) -> (dict, float, int):
+        # Mine probabilities of the frontier cells not known to be mines, and of the interior: the unrevealed cells
+        # off the frontier, which all share one probability. Returns (frontier probabilities, interior probability,
+        # number of interior cells). Only the frontier is visited, never the whole board.
+        board = self._board
+        frontier = np.fromiter(board.frontier, dtype=np.intp, count=len(board.frontier))
+        # Every revealed number that borders the frontier
+        numbers = np.unique(self._nbrs[frontier])
+        numbers = numbers[board.revealed[numbers] & (board.counts[numbers] > 0) & ~board.mines[numbers]]
+        constraints = []
+        for cell in numbers.tolist():
+            cells, n_mines = self._constraint(cell)
+            if cells:
+                constraints.append((tuple(sorted(cells)), n_mines))
+
+        n_frontier = sum(1 for cell in board.frontier if cell not in self._mines)
+        n_interior = board.n_cells - board.n_revealed - len(self._mines) - n_frontier
+        n_left = board.n_mines - len(self._mines)
+        probabilities = self._probabilities(constraints, n_interior, n_left)
+        interior_p = probabilities.pop(None, 0.0)
+        return probabilities, interior_p, n_interior
+
+    def _probabilities(self, constraints: list, n_interior: int, n_left: int) -> dict:
+        # Mine probability of every frontier cell, plus the interior's (shared by all its cells) under key None
+        components = [self._count(component) for component in _components(constraints)]
+
+        # weights[k]: ways to put the rest of the mines in the interior when the frontier holds k
+        weights = [comb(n_interior, n_left - k) if 0 <= n_left - k <= n_interior else 0 for k in range(n_left + 1)]
+        prefix = [[1]]
+        for totals, _ in components:
+            prefix.append(_convolve(prefix[-1], totals))
+        suffix = [1]
+        probabilities = {}
+        for i in range(len(components) - 1, -1, -1):
+            totals, marginals = components[i]
+            others = _convolve(prefix[i], suffix)
+            # gain[a]: weight of every completion of a solution with a mines in this component
+            gain = [sum(x * weights[a + b] for b, x in enumerate(others) if a + b <= n_left)
+                    for a in range(len(totals))]
+            denominator = sum(x * g for x, g in zip(totals, gain))
+            for cell, poly in marginals.items():
+                probabilities[cell] = sum(x * g for x, g in zip(poly, gain)) / denominator if denominator else 0.5
+            suffix = _convolve(suffix, totals)
+
+        if n_interior:
+            totals = prefix[-1]
+            denominator = sum(x * weights[k] for k, x in enumerate(totals) if k <= n_left)
+            numerator = sum(x * comb(n_interior - 1, n_left - k - 1) for k, x in enumerate(totals)
+                            if 0 <= n_left - k - 1 <= n_interior - 1)
+            probabilities[None] = numerator / denominator if denominator else n_left / n_interior
+        return probabilities
+
+    def _count(self, constraints: list) -> (list, dict):
+        # (totals, marginals) for one component: totals[k] solutions hold k mines, and marginals[cell][k] of them have
+        # a mine on cell
+        key = tuple(sorted(constraints))
+        result = self._cache.get(key)
+        if result is None:
+            result = _count_exact(constraints, self.max_states)
+            if result is None:
+                self.n_sampled += 1
+                result = _count_sampled(constraints, self.rng, self.n_samples, self.max_sample_nodes)
+            else:
+                # Exact counts also settle any cell that is a mine in all solutions or in none
+                totals, marginals = result
+                n_solutions = sum(totals)
+                for cell, poly in marginals.items():
+                    n_mine = sum(poly)
+                    if n_mine == 0:
+                        self._mark_safe([cell])
+                    elif n_mine == n_solutions:
+                        self._mark_mines([cell])
+            if len(self._cache) >= self.max_cache:
+                self._cache.pop(next(iter(self._cache)))
+            self._cache[key] = result
+        return result
+
+
+def _components(constraints: list) -> list:
+    # Group constraints that share cells, transitively
+    parent = {}
+
+    def find(cell):
+        while parent[cell] != cell:
+            parent[cell] = parent[parent[cell]]
+            cell = parent[cell]
+        return cell
+
+    for cells, _ in constraints:
+        for cell in cells:
+            parent.setdefault(cell, cell)
+        root = find(cells[0])
+        for cell in cells[1:]:
+            parent[find(cell)] = root
+    groups = {}
+    for constraint in constraints:
+        groups.setdefault(find(constraint[0][0]), []).append(constraint)
+    return list(groups.values())
+
+
+def _cell_order(constraints: list) -> list:
+    # Cells in breadth-first order through shared constraints, so that few constraints are open at any point
+    by_cell = {}
+    for i, (cells, _) in enumerate(constraints):
+        for cell in cells:
+            by_cell.setdefault(cell, []).append(i)
+    start = min(by_cell, key=lambda cell: (len(by_cell[cell]), cell))
+    order = [start]
+    seen = {start}
+    for cell in order:
+        for i in by_cell[cell]:
+            for other in constraints[i][0]:
+                if other not in seen:
+                    seen.add(other)
+                    order.append(other)
+    return order
+
+
+def _count_exact(constraints: list, max_states: int):
+    # Count solutions cell by cell, keeping only the mines each open constraint still needs as state, so that
+    # assignments reaching the same state are counted together. A forward pass and a backward pass over the same
+    # states give each cell's count of solutions with a mine there. Returns None if the states grow past max_states.
+    order = _cell_order(constraints)
+    position = {cell: i for i, cell in enumerate(order)}
+    spans = [(min(position[c] for c in cells), max(position[c] for c in cells)) for cells, _ in constraints]
+    at_cell = [[] for _ in order]
+    for i, (cells, _) in enumerate(constraints):
+        for cell in cells:
+            at_cell[position[cell]].append(i)
+
+    # open_after[i]: constraints (in a fixed order) started at or before cell i and finishing after it
+    open_after = []
+    current = []
+    for i in range(len(order)):
+        current = [j for j in current if spans[j][1] >= i] + [j for j in at_cell[i] if spans[j][0] == i]
+        current = [j for j in current if spans[j][1] > i]
+        open_after.append(tuple(current))
+    # How many cells of each constraint come after cell i
+    left_after = [[sum(1 for c in constraints[j][0] if position[c] > i) for j in range(len(constraints))]
+                  for i in range(len(order))]
+
+    def transitions(i, state, open_before):
+        need = dict(zip(open_before, state))
+        for j in at_cell[i]:
+            if spans[j][0] == i:
+                need[j] = constraints[j][1]
+        for mine in (0, 1):
+            ok = True
+            after = dict(need)
+            for j in at_cell[i]:
+                after[j] -= mine
+                if not 0 <= after[j] <= left_after[i][j]:
+                    ok = False
+                    break
+            if ok:
+                yield mine, tuple(after[j] for j in open_after[i])
+
+    forward = [{(): [1]}]
+    for i in range(len(order)):
+        open_before = open_after[i - 1] if i else ()
+        nxt = {}
+        for state, poly in forward[i].items():
+            for mine, new_state in transitions(i, state, open_before):
+                _add_into(nxt, new_state, poly, mine)
+        if len(nxt) > max_states:
+            return None
+        forward.append(nxt)
+
+    backward = [None] * len(order) + [{(): [1]}]
+    for i in range(len(order) - 1, -1, -1):
+        open_before = open_after[i - 1] if i else ()
+        layer = {}
+        for state in forward[i]:
+            for mine, new_state in transitions(i, state, open_before):
+                poly = backward[i + 1].get(new_state)
+                if poly is not None:
+                    _add_into(layer, state, poly, mine)
+        backward[i] = layer
+
+    totals = backward[0].get((), [0])
+    marginals = {}
+    for i, cell in enumerate(order):
+        open_before = open_after[i - 1] if i else ()
+        acc = {}
+        for state, poly in forward[i].items():
+            for mine, new_state in transitions(i, state, open_before):
+                rest = backward[i + 1].get(new_state)
+                if mine and rest is not None:
+                    _add_into(acc, 0, _convolve(poly, rest), 1)
+        marginals[cell] = acc.get(0, [0])
+    return totals, marginals
+
+
+def _count_sampled(constraints: list, rng: random.Random, n_samples: int, max_nodes: int) -> (list, dict):
+    # Estimate (totals, marginals) from solutions found by randomized depth-first search, with max_nodes search steps
+    # in all. The samples are not exactly uniform, but give usable probabilities where exact counting is out of reach.
+    order = _cell_order(constraints)
+    by_cell = {cell: [] for cell in order}
+    for i, (cells, _) in enumerate(constraints):
+        for cell in cells:
+            by_cell[cell].append(i)
+    totals = [0] * (len(order) + 1)
+    marginals = {cell: [0] * (len(order) + 1) for cell in order}
+
+    nodes = 0
+    for _ in range(n_samples):
+        if nodes >= max_nodes:
+            break
+        need = [n_mines for _, n_mines in constraints]
+        left = [len(cells) for cells, _ in constraints]
+        values = []
+        choices = []
+        i = 0
+        while 0 <= i < len(order) and nodes < max_nodes:
+            nodes += 1
+            cell = order[i]
+            if len(choices) == i:
+                choices.append([0, 1] if rng.random() < 0.5 else [1, 0])
+            if not choices[i]:
+                choices.pop()
+                i -= 1
+                if i >= 0:
+                    # Undo the previous cell before trying its other value
+                    mine = values.pop()
+                    for j in by_cell[order[i]]:
+                        need[j] += mine
+                        left[j] += 1
+                continue
+            mine = choices[i].pop()
+            ok = all(0 <= need[j] - mine <= left[j] - 1 for j in by_cell[cell])
+            if ok:
+                for j in by_cell[cell]:
+                    need[j] -= mine
+                    left[j] -= 1
+                values.append(mine)
+                i += 1
+        if i == len(order):
+            k = sum(values)
+            totals[k] += 1
+            for cell, mine in zip(order, values):
+                marginals[cell][k] += mine
+    if not any(totals):
+        # No solution found within the budget: call every cell a coin flip
+        totals[0] = 2
+        marginals = {cell: [1] for cell in order}
+    return totals, marginals
+
+
+class Solver:
+    def __init__(self, _solver_type='rl', seed=None) -> None:
+        self.type = _solver_type
+        self.rng = random.Random(seed)
+        self.engine = _ENGINES[_solver_type](self.rng) if _solver_type in _ENGINES else None
+        self._n_random_moves = 0
+
+    @property
+    def n_guesses(self) -> int:
+        # Moves made without knowing they were safe; every move of the random solver is one
+        return self.engine.n_guesses if self.engine is not None else self._n_random_moves
+
+    def get_action(self, grid) -> (int, 'Box'):
+        action, box_id = self.get_move(grid)
+        return action, grid._id_to_box(box_id)
+
+    def get_move(self, grid) -> (int, int):
+        return self.get_board_move(grid.board)
+
+    def get_board_move(self, board) -> (int, int):
+        if self.engine is not None:
+            return self.engine.get_move(board)
+
+        # Make random guesses
+        self._n_random_moves += 1
+        action = int(self.rng.random() < 0.5)
+        revealed = board.revealed
+        n_cells = board.n_cells
+        box_id = None
+        i = 0
+        while i < 100:
+            box_id = int(self.rng.random() * n_cells)
+            if revealed[box_id]:
+                i += 1
+            else:
+                break
+
+        # Use keyboard input
+        # while True:
+        #     str_in = input("Next Move (action, target_id): ")
+        #     action, box_id = str_in.split(',')
+        #     action = int(action)
+        #     box_id = int(box_id.strip())
+        #     if revealed[box_id]:
+        #         print("Target box is already revealed. Pick another box.")
+        #     else:
+        #         break
+        return action, box_id
+
+
+_ENGINES = {'logic': LogicSolver, 'prob': ProbabilitySolver}
@@ -0,0 +1,157 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+from board import Board
+from solver import PATTERNS, Solver
+
+# Per-move latencies are kept as counts in log-spaced bins, so any number of games merges in constant memory
+_LATENCY_BINS = np.geomspace(1e-7, 10.0, 401)
+_PERCENTILES = (50, 90, 99, 99.9)
+
+
+def play_game(n_rows: int, n_cols: int, n_mines: int, solver_type: str, seed: int, max_moves=None, latencies=None,
+              patterns=False):
+    # Play one seeded game to the end with the same rules as Grid.step, directly on a Board. Mines come from the same
+    # seeded generator Grid uses, so a seed gives the same game in both. Returns (won, moves, guesses), and appends
+    # each move's solver time to latencies if given. Games still going after max_moves count as lost. patterns has
+    # the logic and probability solvers use the shared pattern table.
+    board = Board(n_rows, n_cols, n_mines)
+    rng = np.random.default_rng(seed)
+    solver = Solver(solver_type, seed=seed)
+    if patterns and solver.engine is not None:
+        solver.engine.patterns = PATTERNS
+    if max_moves is None:
+        max_moves = 10 * board.n_cells
+    moves = 0
+    result = 0
+    while moves < max_moves and not result:
+        t0 = time.perf_counter()
+        action, cell = solver.get_board_move(board)
+        if latencies is not None:
+            latencies.append(time.perf_counter() - t0)
+        moves += 1
+        if action == 0:
+            if not board.has_mines:
+                board.place_mines(cell, rng)
+            board.reveal(cell)
+        elif action == 1:
+            board.toggle_flag(cell)
+        result = board.result()
+    return result > 0, moves, solver.n_guesses
+
+
+def _play_chunk(job):
+    # Worker entry point: play a run of consecutive seeds and return per-game results, a latency histogram and the
+    # pattern table's (hits, lookups) over the chunk
+    n_rows, n_cols, n_mines, solver_type, seeds, max_moves, patterns = job
+    hits, misses = PATTERNS.hits, PATTERNS.misses
+    hist = np.zeros(len(_LATENCY_BINS) - 1, dtype=np.int64)
+    latencies = []
+    games = []
+    for seed in seeds:
+        t0 = time.perf_counter()
+        won, moves, guesses = play_game(n_rows, n_cols, n_mines, solver_type, seed, max_moves, latencies, patterns)
+        games.append((seed, int(won), moves, guesses, time.perf_counter() - t0))
+        # Fold latencies into the histogram as they pile up, to keep memory flat on long chunks
+        if len(latencies) > 100000:
+            hist += np.histogram(latencies, _LATENCY_BINS)[0]
+            latencies.clear()
+    hist += np.histogram(latencies, _LATENCY_BINS)[0]
+    n_hits = PATTERNS.hits - hits
+    return games, hist, (n_hits, n_hits + PATTERNS.misses - misses)
+
+
+def _percentile(hist: np.ndarray, q: float) -> float:
+    # Upper edge of the bin holding the q-th percentile
+    cumulative = np.cumsum(hist)
+    if not cumulative.size or cumulative[-1] == 0:
+        return float('nan')
+    return float(_LATENCY_BINS[1:][np.searchsorted(cumulative, q / 100 * cumulative[-1])])
+
+
+def run_tournament(dims, num_mines, solver_type='logic', n_games=1000, seed=0, processes=None, chunk_size=None,
+                   max_moves=None, on_game=None, patterns=False):
+    # Play n_games games with seeds seed, seed + 1, ... across a pool of worker processes and return summary stats.
+    # Workers are spawned rather than forked so that they import only the board and solver, never pygame. on_game is
+    # called with each game's (seed, won, moves, guesses, seconds) as results arrive.
+    processes = processes or os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = max(1, min(1000, n_games // (4 * processes)))
+    n_rows, n_cols = dims
+    jobs = [(n_rows, n_cols, num_mines, solver_type, range(start, min(start + chunk_size, seed + n_games)), max_moves,
+             patterns) for start in range(seed, seed + n_games, chunk_size)]
+
+    hist = np.zeros(len(_LATENCY_BINS) - 1, dtype=np.int64)
+    n_won = n_moves = n_guesses = n_pattern_hits = n_pattern_lookups = 0
+    game_seconds = 0.0
+    t0 = time.perf_counter()
+    with multiprocessing.get_context('spawn').Pool(processes) as pool:
+        for games, chunk_hist, (pattern_hits, pattern_lookups) in pool.imap_unordered(_play_chunk, jobs):
+            hist += chunk_hist
+            n_pattern_hits += pattern_hits
+            n_pattern_lookups += pattern_lookups
+            for game in games:
+                n_won += game[1]
+                n_moves += game[2]
+                n_guesses += game[3]
+                game_seconds += game[4]
+                if on_game is not None:
+                    on_game(game)
+    elapsed = time.perf_counter() - t0
+
+    return {'dims': list(dims), 'num_mines': num_mines, 'solver': solver_type, 'games': n_games, 'seed': seed,
+            'processes': processes, 'patterns': patterns, 'win_rate': n_won / n_games,
+            'moves_per_game': n_moves / n_games, 'guesses_per_game': n_guesses / n_games,
+            'move_latency_us': {f'p{q:g}': 1e6 * _percentile(hist, q) for q in _PERCENTILES},
+            'pattern_hit_rate': n_pattern_hits / n_pattern_lookups if n_pattern_lookups else 0.0,
+            'game_seconds': game_seconds, 'wall_seconds': elapsed, 'games_per_second': n_games / elapsed}
+
+
+def main(argv=None):
+    # Only the parent needs the difficulty table; importing it here keeps mines out of the workers
+    from mines import difficulties
+
+    parser = argparse.ArgumentParser(description='Play many seeded Minesweeper games with a solver and report stats.')
+    parser.add_argument('difficulty', choices=sorted(difficulties))
+    parser.add_argument('--solver', default='logic', help="solver type: 'logic', 'prob' or 'rl' (random)")
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game; game i uses seed + i')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes (default: one per core)')
+    parser.add_argument('--chunk-size', type=int, default=None, help='games per task handed to a worker')
+    parser.add_argument('--max-moves', type=int, default=None, help='moves before a game counts as lost')
+    parser.add_argument('--patterns', action='store_true',
+                        help='have the solver use the pattern table: more wins for slower moves')
+    parser.add_argument('--csv', help='write one row per game to this file')
+    parser.add_argument('--json', help='write the summary to this file')
+    args = parser.parse_args(argv)
+
+    difficulty = difficulties[args.difficulty]
+    csv_file = open(args.csv, 'w', newline='') if args.csv else None
+    on_game = None
+    if csv_file is not None:
+        writer = csv.writer(csv_file)
+        writer.writerow(['seed', 'won', 'moves', 'guesses', 'seconds'])
+        on_game = writer.writerow
+    try:
+        summary = run_tournament(difficulty['dims'], difficulty['num_mines'], args.solver, args.games, args.seed,
+                                 args.processes, args.chunk_size, args.max_moves, on_game, args.patterns)
+    finally:
+        if csv_file is not None:
+            csv_file.close()
+    summary['difficulty'] = args.difficulty
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    sys.exit(main())